@@ -0,0 +1,217 @@
+"""
+Binary image responses with HTTP caching (ETag / Last-Modified / 304) and byte ranges.
+
+PNGs are served from the data directory or from the moon_crater_images.image_data blobs. Blob bodies are
+read CHUNK_SIZE bytes at a time (Starlette iterates the sync generators on worker threads), so a
+2592x2048 PNG is never held in server memory as a whole; files go out through FileResponse, which lets
+servers that support it send them with sendfile.
+
+Folder bundles pack many images into one length-prefixed stream:
+
+    BUNDLE_MAGIC
+    per image:  <u16 name length> <u32 json length> <u64 png length>  name  json  png   (little endian)
+    end:        a header with all three lengths 0
+
+json is the image's metadata file as stored on disk (empty when not requested or missing). read_bundle()
+decodes the stream on the client side.
+"""
+import hashlib
+import json
+import os
+import struct
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+# Clients may keep the image but must revalidate it, which costs a 304 with no body
+CACHE_CONTROL = "no-cache"
+
+BUNDLE_MAGIC = b"MCADBUN1"
+BUNDLE_RECORD = struct.Struct("<HIQ")
+BUNDLE_MEDIA_TYPE = "application/vnd.mcad.bundle"
+
+
+def make_etag(*parts):
+    """Strong ETag built from whatever identifies one version of the content"""
+    return '"' + hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:32] + '"'
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+def _etag_matches(header, etag):
+    """If-None-Match / If-Range comparison (weak comparison, as RFC 9110 asks for If-None-Match)"""
+    if header.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in header.split(","))
+    return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+def is_not_modified(request, etag, last_modified=None):
+    """True when the client's cached copy is current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_byte_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, None to send everything.
+
+    Raises ValueError when the range cannot be satisfied. Multi-range requests are answered with the
+    full body, which RFC 9110 allows.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first.isdigit() or first == "") or not (last.isdigit() or last == "") or first == last == "":
+        return None  # Malformed ranges are ignored
+
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - int(last)), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def _validator_headers(etag, last_modified):
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def cached_file_response(request: Request, path, media_type):
+    """304 or FileResponse for a file on disk (FileResponse handles Range and uses sendfile when it can).
+
+    Raises FileNotFoundError.
+    """
+    size, etag, last_modified = file_validators(path)
+    headers = _validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def cached_range_response(request: Request, size, etag, read_range, media_type, last_modified=None):
+    """200/206/304/416 response for one representation.
+
+    read_range(start, end) must return an iterator over the bytes start..end (inclusive).
+    """
+    headers = _validator_headers(etag, last_modified)
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send the whole thing
+    if range_header and (if_range is None or _etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read_range(0, size - 1), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_range(start, end), status_code=206, media_type=media_type, headers=headers)
+
+def iter_file(path, start, end):
+    """Yield bytes start..end (inclusive) of a file in chunks; raises IOError if the file got shorter"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"{path} changed while it was being sent")
+            remaining -= len(chunk)
+            yield chunk
+
+def iter_blob(read_connection, table, column, rowid, start, end):
+    """Yield bytes start..end (inclusive) of a SQLite blob in chunks, without loading the whole value.
+
+    read_connection() is a context manager lending a connection (MCADDatabase.read_connection); it is
+    borrowed once the body starts streaming and given back when it ends, so a response that is never sent
+    holds nothing.
+    """
+    with read_connection() as connection:
+        with connection.blobopen(table, column, rowid, readonly=True) as blob:
+            blob.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = blob.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+def file_validators(path):
+    """(size, etag, last_modified) for a file on disk; raises FileNotFoundError"""
+    stat = os.stat(path)
+    return stat.st_size, make_etag("file", stat.st_ino, stat.st_size, stat.st_mtime_ns), stat.st_mtime
+
+def bundle_entries(png_paths, include_json=True):
+    """Stat the files of a bundle up front: [(name, png_path, png_size, json_path or None)] and its ETag"""
+    entries, version = [], []
+    for png_path in png_paths:
+        size, etag, _ = file_validators(png_path)
+        json_path = png_path.with_suffix(".json") if include_json else None
+        if json_path is not None:
+            try:
+                version.append(file_validators(json_path)[1])
+            except FileNotFoundError:
+                json_path = None
+        entries.append((png_path.name, png_path, size, json_path))
+        version.append(etag)
+    return entries, make_etag("bundle", include_json, *version)
+
+def iter_bundle(entries):
+    """Yield the bundle stream for bundle_entries() output, one file chunk at a time"""
+    yield BUNDLE_MAGIC
+    for name, png_path, png_size, json_path in entries:
+        name_bytes = name.encode("utf-8")
+        json_bytes = json_path.read_bytes() if json_path is not None else b""
+        yield BUNDLE_RECORD.pack(len(name_bytes), len(json_bytes), png_size) + name_bytes + json_bytes
+        if png_size:
+            yield from iter_file(png_path, 0, png_size - 1)
+    yield BUNDLE_RECORD.pack(0, 0, 0)
+
+def _read_exactly(stream, size):
+    """Read size bytes from a file-like object or fail on a truncated stream"""
+    parts = []
+    while size > 0:
+        part = stream.read(size)
+        if not part:
+            raise ValueError("Bundle stream ended early")
+        parts.append(part)
+        size -= len(part)
+    return b"".join(parts)
+
+def read_bundle(stream):
+    """Yield (file_name, json_data or None, png_bytes) for each image in a bundle stream (e.g. response.raw)"""
+    if _read_exactly(stream, len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+        raise ValueError("Not an MCAD image bundle")
+    while True:
+        name_length, json_length, png_length = BUNDLE_RECORD.unpack(_read_exactly(stream, BUNDLE_RECORD.size))
+        if name_length == 0:
+            return
+        file_name = _read_exactly(stream, name_length).decode("utf-8")
+        json_data = json.loads(_read_exactly(stream, json_length)) if json_length else None
+        yield file_name, json_data, _read_exactly(stream, png_length)
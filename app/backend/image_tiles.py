@@ -0,0 +1,187 @@
+"""
+Thumbnails and 256x256 tile pyramids for the lunar PNGs, built with Pillow and cached on disk.
+
+Zoom level max_zoom is the full-resolution image; every level below halves it, down to level 0 where the
+whole image fits in one tile. A 2592x2048 image has levels 0-4 (121 tiles in all). The whole pyramid is
+built in one pass from a single decode of the PNG the first time any tile of that image is asked for, or
+ahead of time by build_pyramids(), and stored as:
+
+    cache_dir/<folder>/<image stem>/<source version>/info.json, thumbnail.<ext>, <z>/<x>_<y>.<ext>
+
+The source version comes from the PNG's size and mtime, so a changed image simply gets a new pyramid.
+"""
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_streaming import make_etag
+
+TILE_SIZE = 256
+THUMBNAIL_SIZE = 256  # Longest edge in pixels
+TILE_FORMATS = {"jpeg": ("JPEG", "jpg", "image/jpeg"), "png": ("PNG", "png", "image/png")}
+DEFAULT_TILE_FORMAT = "jpeg"
+JPEG_QUALITY = 85
+
+
+def pyramid_levels(width, height, tile_size=TILE_SIZE):
+    """[(level width, level height, tile columns, tile rows)] from zoom 0 up to full resolution"""
+    max_zoom = max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+    levels = []
+    for z in range(max_zoom + 1):
+        scale = 2 ** (z - max_zoom)
+        level_width, level_height = max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+        levels.append((level_width, level_height, math.ceil(level_width / tile_size),
+                       math.ceil(level_height / tile_size)))
+    return levels
+
+def _display_image(image):
+    """8-bit L or RGB version of a PNG (16-bit grayscale keeps its top 8 bits)"""
+    if image.mode in ("L", "RGB"):
+        return image
+    if image.mode in ("I;16", "I;16B", "I"):
+        pixels = np.asarray(image)
+        if pixels.dtype != np.uint16:
+            pixels = np.clip(pixels, 0, 65535).astype(np.uint16)
+        return Image.fromarray((pixels >> 8).astype(np.uint8), mode="L")
+    return image.convert("RGB" if "A" in image.mode or image.mode == "P" else "L")
+
+
+class TilePyramidCache:
+    """Builds and finds on-disk pyramids; safe to share between request threads"""
+
+    def __init__(self, cache_dir, tile_format=DEFAULT_TILE_FORMAT):
+        self.cache_dir = Path(cache_dir)
+        self.pil_format, self.extension, self.media_type = TILE_FORMATS[tile_format]
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _image_dir(self, folder, png_path):
+        return self.cache_dir / folder / png_path.stem
+
+    def _version_dir(self, folder, png_path):
+        """Pyramid directory for the current version of the PNG; raises FileNotFoundError, also for a folder
+        name that would put it outside cache_dir (the pyramid is written there)"""
+        stat = os.stat(png_path)
+        version = make_etag(stat.st_size, stat.st_mtime_ns).strip('"')[:16]
+        version_dir = self._image_dir(folder, png_path) / f"{version}-{self.extension}"
+        if not version_dir.resolve().is_relative_to(self.cache_dir.resolve()):
+            raise FileNotFoundError(f"{folder}/{png_path.name} is outside the tile cache")
+        return version_dir
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def find_pyramid(self, folder, png_path):
+        """Directory of the PNG's pyramid if it is already built, else None; only a stat and an exists check"""
+        version_dir = self._version_dir(folder, png_path)
+        return version_dir if (version_dir / "info.json").exists() else None
+
+    def ensure_pyramid(self, folder, png_path):
+        """Directory holding the PNG's pyramid, building it first if needed"""
+        version_dir = self._version_dir(folder, png_path)
+        if (version_dir / "info.json").exists():
+            return version_dir
+
+        # One build per image at a time; requests for other images are not held up
+        key = str(version_dir)
+        with self._lock_for(key):
+            if not (version_dir / "info.json").exists():
+                self._build(png_path, version_dir)
+        with self._locks_lock:
+            self._locks.pop(key, None)
+        return version_dir
+
+    def _build(self, png_path, version_dir):
+        with Image.open(png_path) as source:
+            image = _display_image(source)
+            image.load()
+
+        levels = pyramid_levels(*image.size)
+        image_dir = version_dir.parent
+        image_dir.mkdir(parents=True, exist_ok=True)
+        # Write into a scratch directory and rename it into place, so readers never see half a pyramid
+        build_dir = Path(tempfile.mkdtemp(prefix=".build-", dir=image_dir))
+        try:
+            save_options = {"quality": JPEG_QUALITY} if self.pil_format == "JPEG" else {"optimize": False}
+
+            thumbnail = image.copy()
+            thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+            thumbnail.save(build_dir / f"thumbnail.{self.extension}", self.pil_format, **save_options)
+
+            # Full resolution first, then halve for each lower level (reduce() box-filters by 2 in one pass)
+            level_image = image
+            for z in range(len(levels) - 1, -1, -1):
+                level_width, level_height, columns, rows = levels[z]
+                if z < len(levels) - 1:
+                    level_image = level_image.reduce(2)
+                level_dir = build_dir / str(z)
+                level_dir.mkdir()
+                for x in range(columns):
+                    for y in range(rows):
+                        box = (x * TILE_SIZE, y * TILE_SIZE,
+                               min((x + 1) * TILE_SIZE, level_width), min((y + 1) * TILE_SIZE, level_height))
+                        level_image.crop(box).save(level_dir / f"{x}_{y}.{self.extension}", self.pil_format,
+                                                   **save_options)
+
+            info = {
+                "width": image.size[0],
+                "height": image.size[1],
+                "tile_size": TILE_SIZE,
+                "max_zoom": len(levels) - 1,
+                "format": self.extension,
+                "levels": [{"z": z, "width": w, "height": h, "columns": c, "rows": r}
+                           for z, (w, h, c, r) in enumerate(levels)]
+            }
+            # info.json last: its presence marks the pyramid complete
+            (build_dir / "info.json").write_text(json.dumps(info))
+            try:
+                os.replace(build_dir, version_dir)
+            except OSError:
+                if not (version_dir / "info.json").exists():
+                    raise
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        # Older versions of this image are no longer reachable
+        for old in image_dir.iterdir():
+            if old != version_dir and not old.name.startswith(".build-"):
+                shutil.rmtree(old, ignore_errors=True)
+
+    def read_info(self, version_dir):
+        return json.loads((version_dir / "info.json").read_text())
+
+    def tile_file(self, version_dir, z, x, y):
+        """Path of one tile in a pyramid directory (which does not exist for a tile outside the pyramid)"""
+        return version_dir / str(z) / f"{x}_{y}.{self.extension}"
+
+    def thumbnail_file(self, version_dir):
+        return version_dir / f"thumbnail.{self.extension}"
+
+    def build_pyramids(self, data_dir, progress_callback=None):
+        """Build missing pyramids for every PNG under data_dir (one subdirectory per folder)"""
+        data_dir = Path(data_dir)
+        png_paths = sorted(
+            (folder.name, png_path)
+            for folder in data_dir.iterdir() if folder.is_dir()
+            for png_path in folder.iterdir() if png_path.suffix.lower() == ".png"
+        )
+        summary = {"total_files": len(png_paths), "processed_files": 0, "failed_files": 0, "errors": []}
+        for i, (folder, png_path) in enumerate(png_paths):
+            try:
+                self.ensure_pyramid(folder, png_path)
+                summary["processed_files"] += 1
+            except Exception as e:
+                summary["failed_files"] += 1
+                if len(summary["errors"]) < 100:
+                    summary["errors"].append(f"{folder}/{png_path.name}: {e}")
+            if progress_callback and (i % 20 == 19 or i == len(png_paths) - 1):
+                progress_callback(summary)
+        return summary
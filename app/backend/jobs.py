@@ -0,0 +1,143 @@
+"""
+Background jobs for long-running backend work (e.g. the /init_database ingest).
+
+A job is submitted to a small worker pool and returns an id straight away; the HTTP layer then polls
+JobManager.get(job_id).to_dict() for status (queued, running, completed, failed or cancelled), progress,
+throughput and errors.
+
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """State of one background job, updated by its worker and read by the status endpoint"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, progress):
+        """Replace the progress snapshot (called from the worker thread)"""
+        snapshot = copy.deepcopy(progress)  # The worker keeps mutating its own copy
+        with self._lock:
+            self.progress = snapshot
+
+    def is_active(self):
+        with self._lock:
+            return self.status in ("queued", "running")
+
+    def to_dict(self):
+        """Snapshot of the job for the status endpoint"""
+        with self._lock:
+            progress = dict(self.progress)
+            status = self.status
+            started_at, finished_at = self.started_at, self.finished_at
+            result, error = self.result, self.error
+
+        elapsed = None
+        files_per_second = None
+        if started_at is not None:
+            elapsed = (finished_at or time.time()) - started_at
+            done_files = progress.get("processed_files", 0) + progress.get("failed_files", 0)
+            if elapsed > 0:
+                files_per_second = round(done_files / elapsed, 2)
+
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": status,
+            "created_at": self.created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "elapsed_s": elapsed,
+            "files_per_second": files_per_second,
+            "progress": progress,
+            "result": result,
+            "error": error
+        }
+
+
+class JobManager:
+    """Runs jobs on a worker pool and keeps a bounded history of them in memory"""
+
+    def __init__(self, max_workers=2, max_history=100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcad-job")
+        self._jobs = OrderedDict()
+        self._max_history = max_history
+        self._lock = threading.RLock()
+
+    def submit(self, kind, func):
+        """Queue func(report) as a new job and return the Job.
+
+        func receives a report(progress_dict) callback and its return value becomes the job result.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def submit_unique(self, kind, func):
+        """Like submit(), but return the already queued/running job of this kind if there is one"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.is_active():
+                    return job, False
+            return self.submit(kind, func), True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self):
+        """Stop taking jobs; queued ones are dropped and marked cancelled, running ones finish"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for job in self.list():
+            with job._lock:
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+
+    def _run(self, job, func):
+        with job._lock:
+            if job.status == "cancelled":  # Picked up by a worker just as shutdown() cancelled it
+                return
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result = func(job.update_progress)
+        except Exception as e:
+            with job._lock:
+                job.error = str(e)
+                job.status = "failed"
+                job.finished_at = time.time()
+        else:
+            # The status endpoint sees the result, status and finish time change together
+            with job._lock:
+                job.result = result
+                job.status = "completed"
+                job.finished_at = time.time()
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs once the history is full"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.is_active()]
+        for job_id in finished[:max(0, len(self._jobs) - self._max_history)]:
+            del self._jobs[job_id]
@@ -17,43 +17,72 @@
 # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # #
  installed dependencies using PyCharm terminal:
- pip install fastapi uvicorn bcrypt pyjwt python-dotenv sqlalchemy
+ pip install fastapi uvicorn bcrypt pyjwt python-dotenv sqlalchemy pillow
  In PyCharm terminal press: Ctrl + C to stop the server
 """
 #####################################
 ### Implement User Authentication ###
 #####################################
 import json
+import math
 import re
+import sqlite3
 import nltk
 import jwt
 import bcrypt
 import os
 import numpy as np
 import base64
+import gzip
+import hashlib
+import time
+import anyio
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
 from nltk.corpus import words
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status, File, UploadFile
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime, timedelta, UTC
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, ForeignKey, Text, LargeBinary
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Boolean, Float, ForeignKey, Text, LargeBinary
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from image_streaming import (BUNDLE_MEDIA_TYPE, bundle_entries, cached_file_response, cached_range_response,
+                             is_not_modified, iter_blob, iter_bundle, make_etag)
+from image_tiles import TilePyramidCache
+from jobs import JobManager
+from metadata_cache import MetadataCache, path_validator
+from mcad_database_setup import MCADDatabase, connect as connect_mcad_db
 from utils.crater_calculations import compute_camera_altitude, compute_image_dimensions, crater_diameter_meters
+from utils.crater_statistics import log_spaced_edges
 from typing import List, Optional
 
+try:
+    import msgpack
+except ImportError:  # Optional: /manifest falls back to JSON without it
+    msgpack = None
+
 # Load environment variables
 load_dotenv()
 
 # Database configuration
-DATABASE_URL = "sqlite:////Users/joshuajackson/PycharmProjects/mcad/data/database/mcad.db"
+DB_PATH = "/Users/joshuajackson/PycharmProjects/mcad/data/database/mcad.db"
+DATABASE_URL = f"sqlite:///{DB_PATH}"
 DATA_DIR = "/Users/joshuajackson/PycharmProjects/mcad/data/original/mcad_moon_data"
+# Thumbnails and tile pyramids, built on demand (see image_tiles.py)
+TILE_CACHE_DIR = str(Path(DB_PATH).parent / "tiles")
+
+# One data-access layer for the whole backend: the lunar image tables go through a shared MCADDatabase
+# (a connection per worker thread) and the SQLAlchemy engine opens its pooled connections with the same
+# tuned connect(), so both use WAL and readers never wait on the ingest job
+mcad_db = MCADDatabase(DB_PATH)
 
 # Create engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, creator=lambda: connect_mcad_db(DB_PATH))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -84,10 +113,23 @@ class MoonCraterImage(Base):
     file_name = Column(String, index=True)
     png_file = Column(String, unique=True)
     image_data = Column(LargeBinary)
+    content_hash = Column(String)  # sha1 of image_data, the blob's ETag
+    updated_at = Column(Float)  # Unix time the blob was last written, its Last-Modified
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# create_all() never alters existing tables, so add the columns newer models expect
+def add_missing_columns():
+    for table in (MoonCraterImage.__table__,):
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"))
+
+add_missing_columns()
+
 # Dependency to get the database session
 def get_db():
     db = SessionLocal()
@@ -96,6 +138,10 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get the lunar image database (lunar_images / detected_craters)
+def get_mcad_db():
+    return mcad_db
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -104,7 +150,30 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 nltk.download("words")
 english_words = set(words.words())
 
-app = FastAPI()
+# Sync endpoints, DB calls and file reads all run on AnyIO's worker threads (40 by default). SQLite
+# connections are per thread and WAL readers don't block each other, so let more requests run at once.
+THREADPOOL_SIZE = 100
+# CPU-bound work (NumPy batches, base64, pyramid builds) gets its own, smaller limit so it can't starve
+# the I/O threads; the limiter is created in lifespan() on the server's event loop
+CPU_WORKERS = os.cpu_count() or 4
+cpu_limiter = None
+
+async def run_cpu(func, *args, **kwargs):
+    """Run CPU-bound work on a worker thread so the event loop keeps serving other requests."""
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=cpu_limiter)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global cpu_limiter
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    cpu_limiter = anyio.CapacityLimiter(CPU_WORKERS)
+    yield
+    job_manager.shutdown()
+    mcad_db.close()
+
+app = FastAPI(lifespan=lifespan)
+job_manager = JobManager()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # User schema for registration
@@ -232,6 +301,11 @@ curl -X 'POST' 'http://127.0.0.1:8000/compute_crater_size/' \
 -H 'Content-Type: application/json' \
 -d '{"cam_pos": [1890303.161771466, 1971386.8433341454, 2396504.6261527603], "pixel_diameter": 50}'
 
+Many craters at once (columnar results):
+curl -X 'POST' 'http://127.0.0.1:8000/compute_crater_sizes/' \
+-H 'Content-Type: application/json' \
+-d '{"cam_pos": [[1890303.16, 1971386.84, 2396504.62]], "pixel_diameter": [50, 12.5, 230]}'
+
 """
 
 # Constants
@@ -261,133 +335,684 @@ async def compute_crater_size(request: CraterRequest):
         "crater_diameter_m": crater_size_m
     }
 
+@app.get("/compute_crater_size/{folder_num}/{image_num}")
+def compute_crater_size_for_image(folder_num: int, image_num: int, pixel_diameter: float,
+                                  mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Crater diameter in meters for an imported image, using its precomputed meters per pixel."""
+    if pixel_diameter <= 0:
+        raise HTTPException(status_code=400, detail="Crater pixel diameter must be positive")
+
+    geometry = mcad_db.get_image_geometry(folder_num, image_num)
+    if geometry is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if geometry["m_per_px"] is None:
+        raise HTTPException(status_code=422, detail="Image has no camera geometry")
+
+    return {
+        "folder_num": folder_num,
+        "image_num": image_num,
+        "pixel_diameter": pixel_diameter,
+        "camera_altitude_m": geometry["altitude_m"],
+        "image_width_m": geometry["image_width_m"],
+        "image_height_m": geometry["image_height_m"],
+        "m_per_px": geometry["m_per_px"],
+        "crater_diameter_m": pixel_diameter * geometry["m_per_px"]
+    }
+
+class CraterBatchRequest(BaseModel):
+    cam_pos: List[List[float]]  # One camera position (x, y, z) in meters per image
+    pixel_diameter: List[float]  # Crater sizes in pixels
+    image_index: Optional[List[int]] = None  # Row of cam_pos each crater belongs to
+
+@app.post("/compute_crater_sizes/")
+async def compute_crater_sizes(request: CraterBatchRequest):
+    """API endpoint to size many craters (across one or more images) in a single request.
+
+    Per-image values (altitude, image width/height) are returned once per cam_pos row,
+    per-crater values are returned as columns aligned with pixel_diameter.
+    """
+    cam_pos = np.asarray(request.cam_pos, dtype=np.float64)
+    pixel_diameter = np.asarray(request.pixel_diameter, dtype=np.float64)
+
+    if cam_pos.ndim != 2 or cam_pos.shape[1] != 3:
+        raise HTTPException(status_code=400, detail="cam_pos must be a list of [x, y, z] positions")
+    if np.any(pixel_diameter <= 0):
+        raise HTTPException(status_code=400, detail="Crater pixel diameters must be positive")
+
+    # Work out which camera position each crater belongs to
+    if request.image_index is not None:
+        image_index = np.asarray(request.image_index, dtype=np.intp)
+        if image_index.shape != pixel_diameter.shape:
+            raise HTTPException(status_code=400, detail="image_index must have one entry per crater")
+        if image_index.size and (image_index.min() < 0 or image_index.max() >= len(cam_pos)):
+            raise HTTPException(status_code=400, detail="image_index refers to a missing cam_pos row")
+    elif len(cam_pos) == 1:
+        image_index = np.zeros(pixel_diameter.shape, dtype=np.intp)
+    elif len(cam_pos) == len(pixel_diameter):
+        image_index = np.arange(len(cam_pos))
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide image_index, a single cam_pos, or one cam_pos per crater"
+        )
+
+    # Large batches take real CPU time (and .tolist() more), so keep them off the event loop
+    return await run_cpu(_size_crater_batch, cam_pos, pixel_diameter, image_index)
+
+def _size_crater_batch(cam_pos, pixel_diameter, image_index):
+    """Vectorized body of /compute_crater_sizes/."""
+    altitudes = compute_camera_altitude(cam_pos)
+    image_widths_m, image_heights_m = compute_image_dimensions(altitudes, FOV_X, FOV_Y)
+    crater_sizes_m = crater_diameter_meters(pixel_diameter, image_widths_m[image_index], IMAGE_WIDTH_PX)
+
+    return {
+        "image_count": len(cam_pos),
+        "crater_count": len(pixel_diameter),
+        "camera_altitude_m": altitudes.tolist(),
+        "image_width_m": image_widths_m.tolist(),
+        "image_height_m": image_heights_m.tolist(),
+        "image_index": image_index.tolist(),
+        "crater_diameter_m": crater_sizes_m.tolist()
+    }
+
+@app.get("/images/search")
+def search_images(
+    min_time_s: Optional[float] = None, max_time_s: Optional[float] = None,
+    min_altitude_m: Optional[float] = None, max_altitude_m: Optional[float] = None,
+    min_sun_angle_deg: Optional[float] = None, max_sun_angle_deg: Optional[float] = None,
+    min_m_per_px: Optional[float] = None, max_m_per_px: Optional[float] = None,
+    min_cam_pos_x: Optional[float] = None, max_cam_pos_x: Optional[float] = None,
+    min_cam_pos_y: Optional[float] = None, max_cam_pos_y: Optional[float] = None,
+    min_cam_pos_z: Optional[float] = None, max_cam_pos_z: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    mcad_db: MCADDatabase = Depends(get_mcad_db)
+):
+    """Search imported images by time, altitude, sun angle, resolution (m/px) and camera position box.
+
+    Results are ordered by folder and image; pass the returned next_cursor as cursor to get the next page.
+    """
+    filters = {
+        "min_time_s": min_time_s, "max_time_s": max_time_s,
+        "min_altitude_m": min_altitude_m, "max_altitude_m": max_altitude_m,
+        "min_sun_angle_deg": min_sun_angle_deg, "max_sun_angle_deg": max_sun_angle_deg,
+        "min_m_per_px": min_m_per_px, "max_m_per_px": max_m_per_px,
+        "min_cam_pos_x": min_cam_pos_x, "max_cam_pos_x": max_cam_pos_x,
+        "min_cam_pos_y": min_cam_pos_y, "max_cam_pos_y": max_cam_pos_y,
+        "min_cam_pos_z": min_cam_pos_z, "max_cam_pos_z": max_cam_pos_z,
+    }
+
+    after = None
+    if cursor:
+        try:
+            folder_num, image_num = (int(part) for part in cursor.split(":"))
+            after = (folder_num, image_num)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows, next_after = mcad_db.search_images(filters, after=after, limit=limit)
+    return {
+        "images": [dict(row) for row in rows],
+        "next_cursor": f"{next_after[0]}:{next_after[1]}" if next_after else None
+    }
+
+@app.get("/images/coverage")
+def images_covering_point(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-360, le=360),
+                          radius_m: float = Query(0.0, ge=0), limit: int = Query(1000, ge=1, le=10000),
+                          mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Images whose ground footprint covers a lunar lat/lon (degrees), or lies within radius_m of it."""
+    images = mcad_db.find_images_covering(lat, lon, radius_m=radius_m, limit=limit)
+    return {"count": len(images), "images": images}
+
+@app.get("/images/coverage/box")
+def images_in_box(min_lat: float = Query(..., ge=-90, le=90), max_lat: float = Query(..., ge=-90, le=90),
+                  min_lon: float = Query(..., ge=-360, le=360), max_lon: float = Query(..., ge=-360, le=360),
+                  limit: int = Query(1000, ge=1, le=10000),
+                  mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Images whose footprint overlaps a lat/lon box (min_lon > max_lon crosses the antimeridian)."""
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+    images = mcad_db.find_images_in_box(min_lat, max_lat, min_lon, max_lon, limit=limit)
+    return {"count": len(images), "images": images}
+
+CRATER_COLUMNS = ("folder_num", "image_num", "center_x", "center_y", "diameter_pixels",
+                  "diameter_meters", "diameter_miles", "confidence_score")
+REQUIRED_CRATER_COLUMNS = CRATER_COLUMNS[:5]
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def _checked_detections(detections):
+    """Pass detections through, raising ValueError for the first one with a missing, null or non-numeric value."""
+    for number, detection in enumerate(detections, start=1):
+        if not isinstance(detection, dict):
+            raise ValueError(f"Detection {number} is not an object")
+        for name in CRATER_COLUMNS:
+            value = detection.get(name)
+            if value is None:
+                if name in REQUIRED_CRATER_COLUMNS:
+                    raise ValueError(f"Detection {number} has no {name}")
+            elif not _is_number(value) or (name in ("folder_num", "image_num") and not isinstance(value, int)):
+                raise ValueError(f"Detection {number} has an invalid {name}: {value!r}")
+        yield detection
+
+def _parse_ndjson_detections(body: bytes):
+    """One detection object per line; blank lines are ignored."""
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON on line {line_number}")
+
+def _parse_columnar_detections(payload: dict):
+    """{"folder_num": [...], "image_num": [...], "center_x": [...], ...} -> one dict per detection."""
+    if not isinstance(payload, dict):
+        raise ValueError("Expected an object of columns")
+    missing = [name for name in REQUIRED_CRATER_COLUMNS if name not in payload]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    columns = {name: payload[name] for name in CRATER_COLUMNS if name in payload}
+    if not all(isinstance(values, list) for values in columns.values()):
+        raise ValueError("Every column must be an array")
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("All columns must have the same length")
+    names = list(columns)
+    for values in zip(*columns.values()):
+        yield dict(zip(names, values))
+
+@app.post("/craters/bulk")
+async def add_crater_detections_bulk(request: Request, mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Store crater detections for many images in one transaction.
+
+    Send either NDJSON (Content-Type: application/x-ndjson, one detection object per line) or a columnar
+    JSON object of equal-length arrays. Each detection needs folder_num, image_num, center_x, center_y
+    and diameter_pixels; diameter_meters/diameter_miles are computed from the image when left out.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            detections = _parse_ndjson_detections(body)
+        else:
+            detections = _parse_columnar_detections(json.loads(body))
+        # Parsing is lazy, so rows are checked, converted and written chunk by chunk off the event loop;
+        # a bad row rolls back the whole request
+        inserted = await anyio.to_thread.run_sync(mcad_db.add_crater_detections, _checked_detections(detections))
+    except (ValueError, KeyError, TypeError, AttributeError, sqlite3.IntegrityError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid detections: {e}")
+    if not inserted:
+        raise HTTPException(status_code=400, detail="Invalid detections: none given")
+
+    return {"inserted": inserted}
+
+@app.get("/craters/search")
+def search_craters(min_diameter_m: Optional[float] = None, max_diameter_m: Optional[float] = None,
+                   min_confidence: Optional[float] = None, limit: int = Query(1000, ge=1, le=100000),
+                   mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Detected craters across all images by diameter range (meters) and/or confidence threshold."""
+    if min_diameter_m is None and max_diameter_m is None and min_confidence is not None:
+        rows = mcad_db.get_craters_above_confidence(min_confidence, limit=limit)
+    else:
+        rows = mcad_db.get_craters_by_size(min_diameter_m, max_diameter_m, min_confidence, limit=limit)
+    return {"count": len(rows), "craters": [dict(row) for row in rows]}
+
+# Per-crater values returned by /craters/image, as one array each
+IMAGE_CRATER_COLUMNS = ("center_x", "center_y", "diameter_pixels", "diameter_meters", "confidence_score")
+
+@app.get("/craters/image/{folder_num}/{image_num}")
+def get_image_craters(folder_num: int, image_num: int,
+                      min_diameter_pixels: Optional[float] = Query(None, ge=0),
+                      min_confidence: Optional[float] = Query(None, ge=0, le=1),
+                      mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Every detected crater of one image in a single response, largest first, as columns of equal-length
+    arrays (much smaller than one object per crater for images with thousands of detections)."""
+    rows = mcad_db.get_craters_for_image(folder_num, image_num, min_diameter_pixels, min_confidence)
+    columns = {name: [row[name] for row in rows] for name in IMAGE_CRATER_COLUMNS}
+    return {"count": len(rows), "columns": columns}
+
+@app.get("/craters/sfd")
+def crater_size_frequency(folder_num: Optional[int] = None, image_num: Optional[int] = None,
+                          lat: Optional[float] = Query(None, ge=-90, le=90),
+                          lon: Optional[float] = Query(None, ge=-360, le=360),
+                          radius_m: float = Query(0.0, ge=0),
+                          min_diameter_m: Optional[float] = Query(None, gt=0),
+                          max_diameter_m: Optional[float] = Query(None, gt=0),
+                          bins_per_decade: Optional[int] = Query(None, ge=1, le=100),
+                          mcad_db: MCADDatabase = Depends(get_mcad_db)):
+    """Crater size-frequency distribution for one image, a folder, a region (lat/lon + radius_m) or everything.
+
+    By default counts come from the precomputed sqrt(2) diameter bins. Giving min/max_diameter_m or
+    bins_per_decade histograms the matching craters on log-spaced bins instead.
+    """
+    image_ids = None
+    if image_num is not None:
+        if folder_num is None:
+            raise HTTPException(status_code=400, detail="image_num requires folder_num")
+        geometry = mcad_db.get_image_geometry(folder_num, image_num)
+        if geometry is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        image_ids = [geometry["id"]]
+        folder_num = None
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together")
+    if lat is not None:
+        region_ids = [image["id"] for image in mcad_db.find_images_covering(lat, lon, radius_m=radius_m,
+                                                                            limit=1000000)]
+        image_ids = region_ids if image_ids is None else sorted(set(image_ids) & set(region_ids))
+
+    edges = None
+    if min_diameter_m is not None or max_diameter_m is not None or bins_per_decade is not None:
+        if min_diameter_m is None or max_diameter_m is None:
+            raise HTTPException(status_code=400, detail="Custom bins need both min_diameter_m and max_diameter_m")
+        try:
+            edges = log_spaced_edges(min_diameter_m, max_diameter_m, bins_per_decade or 10)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    sfd = mcad_db.crater_size_frequency(folder_num=folder_num, image_ids=image_ids, edges=edges)
+    return {"binning": "sqrt2" if edges is None else "log", "images": None if image_ids is None else len(image_ids),
+            **sfd}
+
+# Directory listings and JSON metadata, revalidated against the files' mtime on every hit
+metadata_cache = MetadataCache()
+
+def _is_data_folder(name):
+    """Dataset folders are named 000-275 (MCADDatabase's layout); older copies used "Folder N"."""
+    return name.isdigit() or (name.startswith("Folder ") and name[len("Folder "):].isdigit())
+
+def _list_directory(directory, dirs=False, suffix=None):
+    """Names of the subdirectories (dirs=True) or files with the given suffix in a directory, in one scan."""
+    with os.scandir(directory) as entries:
+        if dirs:
+            return [entry.name for entry in entries if entry.is_dir()]
+        return [entry.name for entry in entries
+                if entry.is_file() and (suffix is None or entry.name.lower().endswith(suffix))]
+
+async def _cached_json(key, path, build, request: Request = None):
+    """JSON response for build(), served from metadata_cache while path's mtime/size are unchanged.
+
+    The cached value is the rendered response body, so a hit costs one stat() and no parsing or encoding.
+    The ETag follows the same validator, so a client holding a current copy gets a 304.
+    """
+    validator = path_validator(path)
+    etag = make_etag(key, *validator)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request is not None and is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = metadata_cache.lookup(key, validator)
+    if body is None:
+        body = json.dumps(await anyio.to_thread.run_sync(build)).encode("utf-8")
+        metadata_cache.store(key, validator, body, len(body))
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/list_folders")
-def list_folders():
+async def list_folders(request: Request):
     """List all available folders in the data directory."""
+    def build():
+        # One directory scan for the whole listing
+        folders = _list_directory(DATA_DIR, dirs=True)
+        return {"folders": sorted(name for name in folders if _is_data_folder(name))}
+
     try:
-        folder_path = Path(DATA_DIR)
-        folders = [f.name for f in folder_path.iterdir() if f.is_dir() and f.name.startswith("Folder")]
-        return {"folders": folders}
+        return await _cached_json("list_folders", DATA_DIR, build, request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading folders: {str(e)}")
 
 @app.get("/list_png_files/{folder_number}")
-def list_png_files(folder_number: str):
+async def list_png_files(request: Request, folder_number: str):
     """List all PNG files in the specified folder."""
+    folder_path = Path(DATA_DIR) / folder_number
     try:
-        folder_path = Path(DATA_DIR) / folder_number
-        png_files = [f.name for f in folder_path.iterdir() if f.is_file() and f.suffix.lower() == '.png']
-        return {"png_files": png_files}
+        return await _cached_json(("list_png_files", folder_number), folder_path,
+                                  lambda: {"png_files": _list_directory(folder_path, suffix=".png")}, request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading files: {str(e)}")
 
 @app.get("/get_json/{folder_number}/{file_name}")
-def get_json(folder_number: str, file_name: str):
+async def get_json(request: Request, folder_number: str, file_name: str):
     """Fetch JSON data from the local filesystem."""
     try:
         # Construct the path to the JSON file (replacing .png with .json if needed)
         json_file_name = file_name.replace(".png", ".json")
         json_path = Path(DATA_DIR) / folder_number / json_file_name
 
-        # Check if JSON file exists
-        if not json_path.exists():
-            raise HTTPException(status_code=404, detail="JSON file not found")
-
         # Read and parse the JSON file
-        with open(json_path, 'r') as f:
-            json_data = json.load(f)
-
-        return {"json_data": json_data}
+        return await _cached_json(("get_json", folder_number, json_file_name), json_path,
+                                  lambda: {"json_data": json.loads(json_path.read_bytes())}, request)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="JSON file not found")
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Error decoding JSON file")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.get("/get_png/{folder_number}/{file_name}")
-def get_png(folder_number: str, file_name: str):
-    """Fetch and return PNG image file directly."""
-    try:
-        png_path = Path(DATA_DIR) / folder_number / file_name
+def _build_manifest(version, use_msgpack, use_gzip):
+    """Encoded /manifest body for the current dataset version."""
+    columns = mcad_db.get_manifest()
+    manifest = {
+        "version": version,
+        "count": len(columns["folder_num"]),
+        "folders": [f"{folder_num:03d}" for folder_num in sorted(set(columns["folder_num"]))],
+        "columns": columns
+    }
+    body = msgpack.packb(manifest) if use_msgpack else json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(body, compresslevel=6) if use_gzip else body
+
+@app.get("/manifest")
+async def get_manifest(request: Request):
+    """Every imported folder and image with its key metadata, in one response.
+
+    Columns (folder_num, image_num, file_name, time_s, altitude_m, m_per_px, sun_angle_deg, footprint_lat,
+    footprint_lon, nrows, ncols) are parallel lists in folder/image order; folders lists the folder names
+    for /list_png_files, /get_png etc. The body is msgpack when the client accepts application/msgpack
+    (and msgpack is installed), JSON otherwise, and gzipped when accepted. The ETag follows the dataset
+    version, which every import that changes lunar_images bumps, so clients can keep the catalogue and
+    revalidate it for the price of a 304.
+    """
+    use_msgpack = msgpack is not None and "application/msgpack" in request.headers.get("accept", "")
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    version = await anyio.to_thread.run_sync(mcad_db.dataset_version)
+
+    etag = make_etag("manifest", version, use_msgpack, use_gzip)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = ("manifest", use_msgpack, use_gzip)
+    body = metadata_cache.lookup(key, version)
+    if body is None:
+        body = await run_cpu(_build_manifest, version, use_msgpack, use_gzip)
+        metadata_cache.store(key, version, body, len(body))
+    return Response(content=body, media_type="application/msgpack" if use_msgpack else "application/json",
+                    headers=headers)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss/eviction counters and size of the metadata response cache."""
+    return {"metadata": metadata_cache.stats()}
+
+def _find_image_blob(png_file):
+    """(rowid, size, content_hash, updated_at) of an ingested PNG blob, or None.
+
+    Looked up on a pooled read connection, the same path iter_blob then streams the bytes over.
+    """
+    with mcad_db.read_connection() as connection:
+        return connection.execute(
+            f"SELECT id, length(image_data), content_hash, updated_at FROM {MoonCraterImage.__tablename__} "
+            "WHERE png_file = ?", (png_file,)
+        ).fetchone()
 
-        # Check if the file exists
-        if not png_path.exists():
+@app.get("/get_png/{folder_number}/{file_name}")
+async def get_png(request: Request, folder_number: str, file_name: str,
+                  source: Optional[str] = Query(None, pattern="^(db|file)$")):
+    """Fetch a PNG image, streamed in chunks with ETag/Last-Modified validation and Range support.
+
+    Images loaded by /init_database are served from the database, anything else from the data directory;
+    source=db or source=file forces one of them. A matching If-None-Match gets an empty 304.
+
+    The ETag depends on where the image is served from (the blob's content hash, or the file's stat), so
+    running /init_database changes it once for every image it loads and clients download those images again.
+    """
+    if source != "file":
+        blob = await anyio.to_thread.run_sync(_find_image_blob, f"{folder_number}/{file_name}")
+        if blob is not None and blob[1] is not None:
+            rowid, size, content_hash, updated_at = blob
+            # Rows ingested before content hashes were recorded fall back to their id and size
+            etag = make_etag("db", content_hash) if content_hash else make_etag("db", rowid, size)
+            return cached_range_response(
+                request, size, etag,
+                lambda start, end: iter_blob(mcad_db.read_connection, MoonCraterImage.__tablename__, "image_data",
+                                             rowid, start, end),
+                media_type="image/png", last_modified=updated_at
+            )
+        if source == "db":
             raise HTTPException(status_code=404, detail="Image not found")
 
-        # Return the image file directly
-        return FileResponse(png_path, media_type="image/png")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
-
-@app.get("/get_image_base64/{folder_number}/{file_name}")
-def get_image_base64(folder_number: str, file_name: str):
-    """Fetch PNG image and return it as a base64 string."""
+    png_path = Path(DATA_DIR) / folder_number / file_name
     try:
-        png_path = Path(DATA_DIR) / folder_number / file_name
+        return await anyio.to_thread.run_sync(cached_file_response, request, png_path, "image/png")
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+@app.get("/get_bundle/{folder_number}")
+async def get_bundle(request: Request, folder_number: str, names: Optional[str] = None, include_json: bool = True):
+    """Every PNG in a folder (or the comma-separated names) in one length-prefixed binary stream.
+
+    Each record carries the file name, its JSON metadata (unless include_json=false) and the raw PNG bytes;
+    see image_streaming.py for the layout. Files are streamed in chunks, never base64 encoded, and the
+    bundle has an ETag so an unchanged folder costs a 304.
+    """
+    folder_path = Path(DATA_DIR) / folder_number
+    try:
+        if names:
+            file_names = [name for name in names.split(",") if name]
+        else:
+            file_names = sorted(await anyio.to_thread.run_sync(partial(_list_directory, folder_path, suffix=".png")))
+        entries, etag = await anyio.to_thread.run_sync(
+            bundle_entries, [folder_path / Path(name).name for name in file_names], include_json
+        )
+    except (FileNotFoundError, NotADirectoryError) as e:
+        raise HTTPException(status_code=404, detail=f"Not found: {Path(e.filename or folder_number).name}")
 
-        # Check if the file exists
-        if not png_path.exists():
-            raise HTTPException(status_code=404, detail="Image not found")
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Bundle-Count": str(len(entries))}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(iter_bundle(entries), media_type=BUNDLE_MEDIA_TYPE, headers=headers)
+
+@app.get("/get_image_base64/{folder_number}/{file_name}", deprecated=True)
+async def get_image_base64(folder_number: str, file_name: str):
+    """Fetch PNG image and return it as a base64 string (use /get_png or /get_bundle instead)."""
+    try:
+        png_path = anyio.Path(DATA_DIR) / folder_number / file_name
 
         # Read the file and convert to base64
-        with open(png_path, 'rb') as f:
-            image_data = f.read()
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
+        image_data = await png_path.read_bytes()
+        image_base64 = await run_cpu(base64.b64encode, image_data)
 
-        return {"image_base64": image_base64}
+        return {"image_base64": image_base64.decode("utf-8")}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-# Utility endpoint to initialize the database with local data
-@app.post("/init_database")
-def init_database(db: Session = Depends(get_db)):
-    """Initialize the database with data from local files."""
+tile_cache = TilePyramidCache(TILE_CACHE_DIR)
+
+def _source_png(folder_number, image):
+    """Path of a source PNG from a folder and an image file name (".png" may be left off)"""
+    file_name = Path(image).name
+    if not file_name.lower().endswith(".png"):
+        file_name += ".png"
+    return Path(DATA_DIR) / folder_number / file_name
+
+async def _pyramid_dir(folder_number, image):
+    """Pyramid directory of an image. Finding an existing pyramid only stats files, so it runs on the default
+    threadpool; the CPU limiter is used only when the pyramid has to be built."""
+    # The folder name becomes part of the cache path, so only real dataset folders are accepted
+    if not _is_data_folder(folder_number):
+        raise HTTPException(status_code=404, detail="Image or tile not found")
+    png_path = _source_png(folder_number, image)
+    try:
+        version_dir = await anyio.to_thread.run_sync(tile_cache.find_pyramid, folder_number, png_path)
+        if version_dir is None:
+            version_dir = await run_cpu(tile_cache.ensure_pyramid, folder_number, png_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Image or tile not found")
+    return version_dir
+
+async def _pyramid_file_response(request, path):
     try:
-        data_dir = Path(DATA_DIR)
-        folders = [f for f in data_dir.iterdir() if f.is_dir() and f.name.startswith("Folder")]
-
-        processed_files = 0
-
-        for folder in folders:
-            folder_number = folder.name.split(" ")[1]
-            png_files = [f for f in folder.iterdir() if f.is_file() and f.suffix.lower() == '.png']
-
-            for png_file in png_files:
-                file_name = png_file.name
-                png_file_path = str(folder.name) + "/" + file_name
-
-                # Check for corresponding JSON file
-                json_file = png_file.with_suffix('.json')
-
-                if json_file.exists():
-                    # Read JSON data
-                    with open(json_file, 'r') as f:
-                        json_data = json.load(f)
-
-                    # Read image data
-                    with open(png_file, 'rb') as f:
-                        image_data = f.read()
-
-                    # Store in database
-                    db_json = MoonCraterData(
-                        folder_number=folder_number,
-                        file_name=file_name,
-                        png_file=png_file_path,
-                        data=json.dumps(json_data)
-                    )
-
-                    db_image = MoonCraterImage(
-                        folder_number=folder_number,
-                        file_name=file_name,
-                        png_file=png_file_path,
-                        image_data=image_data
-                    )
-
-                    db.add(db_json)
-                    db.add(db_image)
-                    processed_files += 1
+        return await anyio.to_thread.run_sync(cached_file_response, request, path, tile_cache.media_type)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Image or tile not found")
+
+@app.get("/tiles/{folder_number}/{image}/info")
+async def get_tile_info(folder_number: str, image: str):
+    """Size, tile size and per-zoom-level tile grid of an image's pyramid (zoom max_zoom is full resolution)."""
+    version_dir = await _pyramid_dir(folder_number, image)
+    return await anyio.to_thread.run_sync(tile_cache.read_info, version_dir)
+
+@app.get("/tiles/{folder_number}/{image}/{z}/{x}/{y}")
+async def get_tile(request: Request, folder_number: str, image: str, z: int, x: int, y: int):
+    """One 256x256 tile of an image's pyramid; the pyramid is built on the first request for the image."""
+    version_dir = await _pyramid_dir(folder_number, image)
+    return await _pyramid_file_response(request, tile_cache.tile_file(version_dir, z, x, y))
+
+@app.get("/thumbnails/{folder_number}/{image}")
+async def get_thumbnail(request: Request, folder_number: str, image: str):
+    """Small preview of an image (longest edge 256 px)."""
+    version_dir = await _pyramid_dir(folder_number, image)
+    return await _pyramid_file_response(request, tile_cache.thumbnail_file(version_dir))
+
+@app.post("/tiles/build", status_code=status.HTTP_202_ACCEPTED)
+def build_tiles():
+    """Build the missing pyramids for the whole dataset as a background job (poll /jobs/{job_id})."""
+    job, created = job_manager.submit_unique(
+        "build_tiles",
+        lambda report: tile_cache.build_pyramids(DATA_DIR, progress_callback=report)
+    )
+    return {"job_id": job.id, "status": job.status, "created": created, "status_url": f"/jobs/{job.id}"}
+
+# Bounds for one /init_database write; a chunk is flushed when either is reached
+INGEST_CHUNK_FILES = 50
+INGEST_CHUNK_BYTES = 64 * 1024 * 1024
+INGEST_MAX_REPORTED_ERRORS = 100
+
+def _upsert_on_png_file(table):
+    """Bulk INSERT for a moon_crater_* table that overwrites rows already loaded for the same png_file."""
+    stmt = sqlite_insert(table)
+    update_columns = {c.name: stmt.excluded[c.name] for c in table.columns if c.name not in ("id", "png_file")}
+    return stmt.on_conflict_do_update(index_elements=[table.c.png_file], set_=update_columns)
+
+def ingest_local_data(data_dir=DATA_DIR, progress_callback=None):
+    """Stream every PNG/JSON pair under data_dir into the database in bounded chunks.
+
+    Each chunk is written with Core bulk inserts and committed on its own, so memory stays flat and a bad
+    file or chunk only loses that file or chunk. progress_callback(summary) is called after every chunk.
+    """
+    summary = {"processed_files": 0, "skipped_files": 0, "failed_files": 0, "chunks": 0, "errors": []}
+    json_rows, image_rows = [], []
+    chunk_bytes = 0
+    json_stmt = _upsert_on_png_file(MoonCraterData.__table__)
+    image_stmt = _upsert_on_png_file(MoonCraterImage.__table__)
+
+    def record_error(message):
+        summary["failed_files"] += 1
+        if len(summary["errors"]) < INGEST_MAX_REPORTED_ERRORS:
+            summary["errors"].append(message)
+
+    def flush():
+        nonlocal chunk_bytes
+        if not image_rows:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(json_stmt, json_rows)
+                conn.execute(image_stmt, image_rows)
+            summary["processed_files"] += len(image_rows)
+        except Exception as e:
+            # The chunk was rolled back as a unit; earlier chunks stay committed
+            for row in image_rows:
+                record_error(f"{row['png_file']}: {e}")
+        summary["chunks"] += 1
+        json_rows.clear()
+        image_rows.clear()
+        chunk_bytes = 0
+        print(f"Ingested {summary['processed_files']} files ({summary['failed_files']} failed)")
+        if progress_callback:
+            progress_callback(summary)
+
+    data_dir = Path(data_dir)
+    folders = sorted(f for f in data_dir.iterdir() if f.is_dir() and _is_data_folder(f.name))
+
+    # List everything up front (paths only) so progress can be reported against a total
+    work = []
+    for folder in folders:
+        png_files = sorted(f for f in folder.iterdir() if f.is_file() and f.suffix.lower() == '.png')
+        work.append((folder, png_files))
+    summary["total_files"] = sum(len(png_files) for _, png_files in work)
+    if progress_callback:
+        progress_callback(summary)
+
+    for folder, png_files in work:
+        folder_number = folder.name.split(" ")[-1]
+
+        for png_file in png_files:
+            file_name = png_file.name
+            png_file_path = str(folder.name) + "/" + file_name
+
+            # Check for corresponding JSON file
+            json_file = png_file.with_suffix('.json')
+            if not json_file.exists():
+                summary["skipped_files"] += 1
+                continue
+
+            try:
+                # Read JSON data
+                with open(json_file, 'r') as f:
+                    json_data = json.load(f)
+
+                # Read image data
+                with open(png_file, 'rb') as f:
+                    image_data = f.read()
+            except Exception as e:
+                record_error(f"{png_file_path}: {e}")
+                continue
+
+            json_rows.append({
+                "folder_number": folder_number,
+                "file_name": file_name,
+                "png_file": png_file_path,
+                "data": json.dumps(json_data)
+            })
+            image_rows.append({
+                "folder_number": folder_number,
+                "file_name": file_name,
+                "png_file": png_file_path,
+                "image_data": image_data,
+                "content_hash": hashlib.sha1(image_data).hexdigest(),
+                "updated_at": time.time()
+            })
+            chunk_bytes += len(image_data)
+
+            if len(image_rows) >= INGEST_CHUNK_FILES or chunk_bytes >= INGEST_CHUNK_BYTES:
+                flush()
+
+    flush()
+    return summary
 
-        db.commit()
-        return {"message": f"Database initialized with {processed_files} files"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database initialization error: {str(e)}")
\ No newline at end of file
+# Utility endpoint to initialize the database with local data
+@app.post("/init_database", status_code=status.HTTP_202_ACCEPTED)
+def init_database():
+    """Start loading the local data files into the database as a background job.
+
+    Returns the job id right away; poll /jobs/{job_id} for progress. If an ingest is already running,
+    its job is returned instead of starting a second one.
+    """
+    job, created = job_manager.submit_unique(
+        "init_database",
+        lambda report: ingest_local_data(progress_callback=report)
+    )
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "created": created,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@app.get("/jobs")
+def list_jobs():
+    """List recent background jobs, newest last."""
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status, progress, throughput and errors for one background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
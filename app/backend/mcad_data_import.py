@@ -16,10 +16,10 @@ def main():
     # Import all data
     print("Starting import of MCAD lunar data...")
     start_time = time.time()
-    db.import_mcad_data()
+    imported = db.import_mcad_data()
     end_time = time.time()
 
-    print(f"Import completed in {end_time - start_time:.2f} seconds")
+    print(f"Import completed in {end_time - start_time:.2f} seconds ({imported} images)")
 
     # Test a query
     print("\nTesting database queries:")
@@ -28,8 +28,13 @@ def main():
     sample = db.get_image_data(0, 0)  # Folder 000, image_0
     if sample:
         print(f"Found image: Folder 000, Image 0")
-        print(f"Resolution: {sample[11]} rows x {sample[12]} columns")
-        print(f"PNG path: {sample[1]}")
+        print(f"Resolution: {sample['nrows']} rows x {sample['ncols']} columns")
+        if sample['cam_pos_x'] is None:
+            # Stored as NULLs when the JSON has no "Cam Pos (m)"
+            print("Camera position: unknown")
+        else:
+            print(f"Camera position: ({sample['cam_pos_x']:.2f}, {sample['cam_pos_y']:.2f}, {sample['cam_pos_z']:.2f}) m")
+        print(f"PNG path: {sample['png_path']}")
     else:
         print("Sample image not found")
 
@@ -0,0 +1,47 @@
+"""
+Upgrade an existing MCAD database to the current schema.
+
+Opening a database with MCADDatabase already applies any pending migrations; this script does it explicitly
+and reports what changed, e.g. converting the stringified camera vectors in lunar_images (sun_los, cam_pos_m,
+cam_quat_v, cam_los) into numeric x/y/z columns. It then checks that the crater queries use their indexes
+(exit status 1 if one does not).
+
+Usage: python mcad_database_migrate.py [path/to/mcad.db]
+
+"""
+import sys
+from pathlib import Path
+
+from mcad_database_setup import MCADDatabase
+
+DEFAULT_DB_PATH = "/Users/joshuajackson/PycharmProjects/mcad/data/database/mcad.db"
+
+
+def main():
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH)
+    if not db_path.exists():
+        print(f"Database not found: {db_path}")
+        sys.exit(1)
+
+    print(f"Migrating {db_path}...")
+    # MCADDatabase runs migrate_schema() when it opens the file; a second call reports nothing left to do
+    db = MCADDatabase(db_path)
+    applied = db.applied_migrations
+    plan_checks = db.check_query_plans()
+    db.close()
+
+    if applied:
+        for step in applied:
+            print(f"Applied: {step}")
+    else:
+        print("Database is already up to date")
+
+    print("\nQuery plan checks:")
+    for name, ok, plan in plan_checks:
+        print(f"  {'OK  ' if ok else 'FAIL'} {name}: {'; '.join(plan)}")
+    if not all(ok for _, ok, _ in plan_checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,48 +6,431 @@ This script contains functions such as initializing a database, creating a datab
 and PNG data, etc.
 
 """
+import ast
+import hashlib
 import json
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
 
-class MCADDatabase:
-    def __init__(self, db_path="/Users/joshuajackson/PycharmProjects/mcad/data/database/mcad.db"):
-        """Initialize the MCAD database"""
-        self.db_path = Path(db_path)
-        # Ensure parent directory exists
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+from utils.crater_calculations import MOON_RADIUS, compute_camera_altitude, compute_image_dimensions, compute_sun_angle
+from utils.crater_statistics import (count_by_bin, cumulative_counts, histogram_chunks, size_bin_edges,
+                                     size_bin_index)
+from utils.lunar_coverage import angular_distance_deg, bounding_boxes, compute_footprints, normalize_longitude
 
-        self.connection = None
-        self.cursor = None
-        self.initialize_database()
 
-    def initialize_database(self):
-        """Create the database and tables if they don't exist"""
-        self.connection = sqlite3.connect(str(self.db_path))
-        self.cursor = self.connection.cursor()
+METERS_TO_MILES = 0.000621371
 
-        # Create tables
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lunar_images (
+# Applied to every connection opened by connect(). WAL lets readers run alongside the importer's write
+# transactions; synchronous=NORMAL is safe with WAL (a power cut can only lose the last commits).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16384,  # KiB: 16 MiB of private page cache per connection; mmap pages are shared
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+SQLITE_BUSY_TIMEOUT_S = 30
+# Prepared statements kept per connection (sqlite3's default is 128)
+SQLITE_CACHED_STATEMENTS = 512
+# Idle connections kept for streaming blobs (see MCADDatabase.read_connection); busier moments open extra ones
+READ_POOL_SIZE = 4
+
+# Columns written by the importer, in insert order (the JSON vectors are stored one component per column)
+_LUNAR_IMAGE_DATA_COLUMNS = (
+    "folder_num", "image_num", "png_path", "json_path", "time_s",
+    "sun_los_x", "sun_los_y", "sun_los_z",
+    "cam_pos_x", "cam_pos_y", "cam_pos_z",
+    "cam_quat_s", "cam_quat_v_x", "cam_quat_v_y", "cam_quat_v_z",
+    "cam_los_x", "cam_los_y", "cam_los_z",
+    "fov_x_rad", "fov_y_rad", "nrows", "ncols"
+)
+
+# Per-image geometry derived from the columns above at import time (see _derived_geometry)
+_LUNAR_IMAGE_DERIVED_COLUMNS = (
+    "altitude_m", "image_width_m", "image_height_m", "m_per_px", "sun_angle_deg",
+    "footprint_lat", "footprint_lon", "footprint_radius_deg"
+)
+
+
+def connect(db_path):
+    """Open a tuned SQLite connection to the MCAD database.
+
+    Shared by MCADDatabase and the SQLAlchemy engine in main.py (as its creator), so both talk to the file
+    with the same settings. The connection may be handed between threads but must not be used by two at once.
+    """
+    connection = sqlite3.connect(str(db_path), timeout=SQLITE_BUSY_TIMEOUT_S, check_same_thread=False,
+                                 cached_statements=SQLITE_CACHED_STATEMENTS)
+    for pragma, value in SQLITE_PRAGMAS.items():
+        connection.execute(f"PRAGMA {pragma} = {value}")
+    return connection
+
+def _lunar_images_table_sql(table_name):
+    """CREATE TABLE statement for lunar_images (also used to rebuild it during migrations)"""
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table_name} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             folder_num INTEGER NOT NULL,
             image_num INTEGER NOT NULL,
             png_path TEXT NOT NULL,
             json_path TEXT NOT NULL,
-            time_s TEXT,
-            sun_los TEXT,
-            cam_pos_m TEXT,
+            time_s REAL,
+            sun_los_x REAL,
+            sun_los_y REAL,
+            sun_los_z REAL,
+            cam_pos_x REAL,
+            cam_pos_y REAL,
+            cam_pos_z REAL,
             cam_quat_s REAL,
-            cam_quat_v TEXT,
-            cam_los TEXT,
+            cam_quat_v_x REAL,
+            cam_quat_v_y REAL,
+            cam_quat_v_z REAL,
+            cam_los_x REAL,
+            cam_los_y REAL,
+            cam_los_z REAL,
             fov_x_rad REAL,
             fov_y_rad REAL,
             nrows INTEGER,
             ncols INTEGER,
+            altitude_m REAL,
+            image_width_m REAL,
+            image_height_m REAL,
+            m_per_px REAL,
+            sun_angle_deg REAL,
+            footprint_lat REAL,
+            footprint_lon REAL,
+            footprint_radius_deg REAL,
             UNIQUE(folder_num, image_num)
         )
-        ''')
+        '''
+
+
+# Secondary indexes on lunar_images, one per kind of filter search_images() supports
+_LUNAR_IMAGE_INDEXES = {
+    "idx_lunar_images_altitude_sun": "altitude_m, sun_angle_deg",
+    "idx_lunar_images_sun_angle": "sun_angle_deg",
+    "idx_lunar_images_m_per_px": "m_per_px",
+    "idx_lunar_images_time": "time_s",
+    "idx_lunar_images_cam_pos": "cam_pos_x, cam_pos_y, cam_pos_z",
+    "idx_lunar_images_fov_x": "fov_x_rad",
+}
+
+# Indexes on detected_craters. The per-image one covers every column get_craters_for_image() reads, so a
+# per-image fetch is one index range read, already in diameter order, however large the table gets.
+_DETECTED_CRATER_INDEXES = {
+    "idx_detected_craters_image_diameter": "image_id, diameter_pixels DESC, center_x, center_y, "
+                                           "diameter_meters, diameter_miles, confidence_score, detection_date",
+    "idx_detected_craters_diameter_m": "diameter_meters, confidence_score",
+    "idx_detected_craters_confidence": "confidence_score",
+}
+
+# Hot queries and the index each one is expected to use (see check_query_plans)
+_QUERY_PLAN_CHECKS = (
+    ("craters for one image",
+     "SELECT center_x, center_y, diameter_pixels, diameter_meters, diameter_miles, confidence_score, detection_date "
+     "FROM detected_craters WHERE image_id = ? ORDER BY diameter_pixels DESC",
+     (1,), "idx_detected_craters_image_diameter"),
+    ("craters by diameter",
+     "SELECT c.id FROM detected_craters c CROSS JOIN lunar_images i ON i.id = c.image_id "
+     "WHERE c.diameter_meters >= ? AND c.diameter_meters <= ? ORDER BY c.diameter_meters LIMIT 10",
+     (0, 1), "idx_detected_craters_diameter_m"),
+    ("craters by confidence",
+     "SELECT c.id FROM detected_craters c CROSS JOIN lunar_images i ON i.id = c.image_id "
+     "WHERE c.confidence_score >= ? ORDER BY c.confidence_score DESC LIMIT 10",
+     (0.5,), "idx_detected_craters_confidence"),
+)
+
+# Range filters accepted by search_images(): keyword prefix -> column
+_SEARCH_RANGE_COLUMNS = {
+    "time_s": "time_s",
+    "altitude_m": "altitude_m",
+    "sun_angle_deg": "sun_angle_deg",
+    "m_per_px": "m_per_px",
+    "cam_pos_x": "cam_pos_x",
+    "cam_pos_y": "cam_pos_y",
+    "cam_pos_z": "cam_pos_z",
+}
+
+
+def _placeholders(count):
+    """'?, ?, ...' for an INSERT with count values"""
+    return ", ".join(["?"] * count)
+
+
+def _to_float(value):
+    """float(value), or None for missing/unparseable values"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _vector3(value):
+    """Split a 3-vector into (x, y, z) floats.
+
+    Accepts a list as found in the JSON files or the str(list) text older databases stored;
+    anything else becomes (None, None, None).
+    """
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            return None, None, None
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        return None, None, None
+    return tuple(_to_float(v) for v in value)
+
+
+def _derived_geometry(cam_pos, sun_los, cam_los, fov_x, fov_y, ncols):
+    """Altitude, ground footprint, meters per pixel and sun angle for many images at once.
+
+    Takes (N, 3) arrays of camera positions, Sun lines of sight and camera lines of sight and (N,) arrays
+    of FOVs and image widths in pixels, and returns N rows of _LUNAR_IMAGE_DERIVED_COLUMNS values, with
+    None where an input was missing.
+    """
+    cam_pos = np.asarray(cam_pos, dtype=np.float64).reshape(-1, 3)
+    altitude = compute_camera_altitude(cam_pos)
+    image_width_m, image_height_m = compute_image_dimensions(
+        altitude, np.asarray(fov_x, dtype=np.float64), np.asarray(fov_y, dtype=np.float64))
+    m_per_px = image_width_m / np.asarray(ncols, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sun_angle = compute_sun_angle(np.asarray(sun_los, dtype=np.float64).reshape(-1, 3), cam_pos)
+    footprint_lat, footprint_lon, footprint_radius = compute_footprints(cam_pos, cam_los, fov_x, fov_y)
+
+    derived = np.column_stack((altitude, image_width_m, image_height_m, m_per_px, sun_angle,
+                               footprint_lat, footprint_lon, footprint_radius))
+    return [tuple(None if np.isnan(value) else value for value in row) for row in derived.tolist()]
+
+
+def _with_derived_geometry(rows):
+    """Append the derived geometry columns to importer rows (laid out as _LUNAR_IMAGE_DATA_COLUMNS)"""
+    if not rows:
+        return []
+    index = {name: i for i, name in enumerate(_LUNAR_IMAGE_DATA_COLUMNS)}
+    # None -> NaN, so missing values flow through the math and come back out as None
+    cam_pos = [[row[index["cam_pos_x"]], row[index["cam_pos_y"]], row[index["cam_pos_z"]]] for row in rows]
+    sun_los = [[row[index["sun_los_x"]], row[index["sun_los_y"]], row[index["sun_los_z"]]] for row in rows]
+    cam_los = [[row[index["cam_los_x"]], row[index["cam_los_y"]], row[index["cam_los_z"]]] for row in rows]
+    derived = _derived_geometry(
+        np.array(cam_pos, dtype=np.float64),
+        np.array(sun_los, dtype=np.float64),
+        np.array(cam_los, dtype=np.float64),
+        np.array([row[index["fov_x_rad"]] for row in rows], dtype=np.float64),
+        np.array([row[index["fov_y_rad"]] for row in rows], dtype=np.float64),
+        np.array([row[index["ncols"]] for row in rows], dtype=np.float64)
+    )
+    return [row + extra for row, extra in zip(rows, derived)]
+
+
+def _footprint_boxes(rows, key_columns):
+    """R*Tree rows (min_lat, max_lat, min_lon, max_lon, *keys) for rows with footprint_lat/lon/radius_deg"""
+    if not rows:
+        return []
+    min_lat, max_lat, min_lon, max_lon = bounding_boxes(
+        np.array([row["footprint_lat"] for row in rows], dtype=np.float64),
+        np.array([row["footprint_lon"] for row in rows], dtype=np.float64),
+        np.array([row["footprint_radius_deg"] for row in rows], dtype=np.float64)
+    )
+    return [
+        (box[0], box[1], box[2], box[3], *(row[key] for key in key_columns))
+        for row, box in zip(rows, np.column_stack((min_lat, max_lat, min_lon, max_lon)).tolist())
+    ]
+
+
+def _file_unchanged(known, path, stat):
+    """True if a manifest record still matches the file's path, mtime and size"""
+    return known is not None and known[0] == path and known[1] == stat.st_mtime_ns and known[2] == stat.st_size
+
+
+def _scan_image_folder(base_path, folder_num, manifest, force=False):
+    """Find new or changed images in one data folder and parse their JSON.
+
+    manifest maps (folder_num, image_num, kind) -> (path, mtime_ns, size, content_hash) as recorded by the
+    last import. Files whose path, mtime and size still match are skipped without being opened; a JSON
+    file whose stat changed but whose content hash did not only gets its manifest record refreshed.
+
+    Returns (rows, manifest_records, present, warnings, failed): rows to upsert into lunar_images, records
+    to upsert into source_manifest, the image numbers that have both files on disk (None when the folder
+    itself is missing), any warnings and the number of images whose files could not be read or parsed.
+    An image's manifest records are only returned once its JSON has parsed, so a failed image is retried
+    by the next import. Runs on the import thread pool, so it only touches the filesystem, never the
+    database.
+    """
+    folder_name = f"{folder_num:03d}"
+    folder_path = base_path / folder_name
+    warnings = []
+
+    # One directory listing instead of two exists() calls per image
+    try:
+        entries = {entry.name: entry for entry in os.scandir(folder_path)}
+    except FileNotFoundError:
+        return [], [], None, [f"Warning: Folder {folder_name} does not exist. Skipping."], 0
+
+    # Max files is 10 per folder (0-9), except folder 275 which has 7
+    max_files = 7 if folder_num == 275 else 10
+
+    rows = []
+    manifest_records = []
+    present = []
+    failed = 0
+    for image_num in range(max_files):
+        json_entry = entries.get(f"image_{image_num}.json")
+        png_entry = entries.get(f"image_{image_num}.png")
+
+        # Check if both files exist
+        if json_entry is None or png_entry is None:
+            warnings.append(f"Warning: Missing file(s) for folder {folder_name}, image {image_num}. Skipping.")
+            continue
+        present.append(image_num)
+
+        json_path = str(folder_path / json_entry.name)
+        png_path = str(folder_path / png_entry.name)
+        known_json = manifest.get((folder_num, image_num, "json"))
+        known_png = manifest.get((folder_num, image_num, "png"))
+
+        try:
+            json_stat = json_entry.stat()
+            png_stat = png_entry.stat()
+
+            # Only the PNG's path goes into lunar_images, so a stat change is enough to track it
+            # (hashing every multi-megabyte PNG would cost more than the whole import)
+            png_unchanged = _file_unchanged(known_png, png_path, png_stat)
+            image_records = []
+            if force or not png_unchanged:
+                image_records.append(
+                    (folder_num, image_num, "png", png_path, png_stat.st_mtime_ns, png_stat.st_size, None))
+
+            if not force and png_unchanged and _file_unchanged(known_json, json_path, json_stat):
+                continue
+
+            with open(json_path, 'rb') as f:
+                raw_json = f.read()
+            content_hash = hashlib.sha256(raw_json).hexdigest()
+            image_records.append(
+                (folder_num, image_num, "json", json_path, json_stat.st_mtime_ns, json_stat.st_size, content_hash))
+
+            # Touched but identical, and still at the same paths: the row is already up to date
+            # (a recorded hash always belongs to JSON that parsed)
+            if (not force and known_json is not None and known_png is not None
+                    and known_json[0] == json_path and known_json[3] == content_hash and known_png[0] == png_path):
+                manifest_records.extend(image_records)
+                continue
+
+            json_data = json.loads(raw_json)
+        except Exception as e:
+            warnings.append(f"Error processing {json_path}: {e}")
+            failed += 1
+            continue
+        manifest_records.extend(image_records)
+
+        rows.append((
+            folder_num,
+            image_num,
+            png_path,
+            json_path,
+            _to_float(json_data.get("Time (s)")),
+            *_vector3(json_data.get("SUN LoS")),
+            *_vector3(json_data.get("Cam Pos (m)")),
+            json_data.get("Cam Quat (s)"),
+            *_vector3(json_data.get("Cam Quat (v)")),
+            *_vector3(json_data.get("Cam LoS")),
+            json_data.get("FOV X (rad)"),
+            json_data.get("FOV Y (rad)"),
+            json_data.get("Nrows"),
+            json_data.get("Ncols")
+        ))
+
+    return rows, manifest_records, present, warnings, failed
+
+
+class _ImportBatch:
+    """Changes collected from scanned folders until they are written in one transaction"""
+
+    def __init__(self):
+        self.rows = []
+        self.manifest_records = []
+        self.deleted = []
+        self.folders = []
+
+    def size(self):
+        return len(self.rows) + len(self.manifest_records) + len(self.deleted)
+
+
+class MCADDatabase:
+    def __init__(self, db_path="/Users/joshuajackson/PycharmProjects/mcad/data/database/mcad.db"):
+        """Initialize the MCAD database"""
+        self.db_path = Path(db_path)
+        # Ensure parent directory exists
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Each thread gets its own connection and cursor (see the connection property), so one
+        # MCADDatabase can be shared by the whole FastAPI threadpool and the import job
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Connections lent out whole to one reader at a time, e.g. a blob streamed across several threads
+        self._read_pool = queue.SimpleQueue()
+        # (folder_num, image_num) -> (lunar_images.id, m_per_px), valid for one dataset_version(): an import
+        # in any process (which may delete an image or re-add it under a new id) empties it
+        self._image_cache = {}
+        self._image_cache_version = None
+        self._image_cache_lock = threading.Lock()
+        self.initialize_database()
+
+    @property
+    def connection(self):
+        """This thread's connection, opened on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = connect(self.db_path)
+            # Rows can be read by position or by column name
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+            self._local.cursor = connection.cursor()
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def read_connection(self):
+        """Borrow a pooled connection for a read that outlives one call on one thread.
+
+        A streamed response reads its chunks from whichever threadpool thread is free, so it cannot use the
+        per-thread connection; it holds one of these until it is done, then puts it back for the next request.
+        """
+        try:
+            connection = self._read_pool.get_nowait()
+        except queue.Empty:
+            connection = connect(self.db_path)
+        broken = False
+        try:
+            yield connection
+        except sqlite3.Error:
+            broken = True
+            raise
+        finally:
+            # A client that disconnects mid-stream still returns a usable connection
+            if broken or self._read_pool.qsize() >= READ_POOL_SIZE:
+                connection.close()
+            else:
+                self._read_pool.put(connection)
+
+    @property
+    def cursor(self):
+        """This thread's cursor"""
+        self.connection  # Opens this thread's connection if needed
+        return self._local.cursor
+
+    def initialize_database(self):
+        """Create the database and tables if they don't exist"""
+        # Create tables
+        self.cursor.execute(_lunar_images_table_sql("lunar_images"))
 
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS detected_craters (
@@ -64,148 +447,748 @@ class MCADDatabase:
         )
         ''')
 
+        # Source files behind each lunar_images row, used to skip unchanged files on re-import
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS source_manifest (
+            folder_num INTEGER NOT NULL,
+            image_num INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            content_hash TEXT,
+            PRIMARY KEY (folder_num, image_num, kind)
+        )
+        ''')
+
+        # Folders finished by an import that has not completed yet (see import_mcad_data)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            folder_num INTEGER PRIMARY KEY,
+            image_count INTEGER NOT NULL,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # Counters such as the lunar_images version that /manifest uses as its ETag
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dataset_info (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''')
+
         self.connection.commit()
 
-    def import_mcad_data(self, base_path="/Users/joshuajackson/PycharmProjects/mcad/data/original/mcad_moon_data"):
-        """Import all JSON and PNG files from the mcad_moon_data directory"""
+        self.applied_migrations = self.migrate_schema()
+
+    def migrate_schema(self):
+        """Bring a database created by an older version of this script up to the current schema.
+
+        Every step checks the actual table layout first, so this is safe to run on any database.
+        Returns the names of the steps that were applied.
+        """
+        applied = []
+
+        self.cursor.execute("PRAGMA table_info(lunar_images)")
+        columns = {row["name"] for row in self.cursor.fetchall()}
+        backfill_geometry = False
+        if "cam_pos_m" in columns:
+            self._migrate_vector_columns()
+            applied.append("lunar_images: stringified vectors -> numeric columns")
+            backfill_geometry = True
+        else:
+            missing = [name for name in _LUNAR_IMAGE_DERIVED_COLUMNS if name not in columns]
+            for name in missing:
+                self.cursor.execute(f"ALTER TABLE lunar_images ADD COLUMN {name} REAL")
+            if missing:
+                applied.append(f"lunar_images: added {', '.join(missing)}")
+                backfill_geometry = True
+
+        if backfill_geometry:
+            updated = self._backfill_derived_geometry()
+            self._bump_dataset_version()
+            applied.append(f"lunar_images: computed derived geometry for {updated} images")
+
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'lunar_image_footprints'")
+        if self.cursor.fetchone() is None:
+            # R*Tree over each image's footprint bounding box (see utils/lunar_coverage.py)
+            self.cursor.execute('''
+            CREATE VIRTUAL TABLE lunar_image_footprints USING rtree (
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+            ''')
+            backfill_geometry = True
+            applied.append("lunar_image_footprints: created spatial index")
+
+        if backfill_geometry:
+            self._rebuild_footprint_index()
+
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'crater_size_bins'")
+        if self.cursor.fetchone() is None:
+            # Materialized per-image sqrt(2)-bin crater counts (see utils/crater_statistics.py),
+            # kept current by add_crater_detections
+            self.cursor.execute('''
+            CREATE TABLE crater_size_bins (
+                image_id INTEGER NOT NULL,
+                bin_index INTEGER NOT NULL,
+                crater_count INTEGER NOT NULL,
+                PRIMARY KEY (image_id, bin_index)
+            ) WITHOUT ROWID
+            ''')
+            summarized = self.refresh_crater_size_bins()
+            applied.append(f"crater_size_bins: summarized {summarized} craters")
+
+        self._create_indexes()
+        return applied
+
+    def _create_indexes(self):
+        """Create the secondary indexes (after migrations, since they may reference new columns)"""
+        with self.connection:
+            # (altitude_m, sun_angle_deg) also serves altitude-only filters
+            self.cursor.execute("DROP INDEX IF EXISTS idx_lunar_images_altitude")
+            for name, columns in _LUNAR_IMAGE_INDEXES.items():
+                self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON lunar_images ({columns})")
+            for name, columns in _DETECTED_CRATER_INDEXES.items():
+                self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON detected_craters ({columns})")
+
+    def query_plan(self, query, params=()):
+        """EXPLAIN QUERY PLAN details for a query, e.g. to check that it uses an index"""
+        self.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row["detail"] for row in self.cursor.fetchall()]
+
+    def check_query_plans(self):
+        """Check that the crater queries use their indexes instead of scanning detected_craters
+
+        Returns (name, ok, plan) for each checked query.
+        """
+        results = []
+        for name, query, params, index in _QUERY_PLAN_CHECKS:
+            plan = self.query_plan(query, params)
+            results.append((name, any(index in step for step in plan), plan))
+        return results
+
+    def _backfill_derived_geometry(self):
+        """Compute the derived geometry columns for every row in one vectorized pass"""
+        self.cursor.execute('''
+        SELECT id, cam_pos_x, cam_pos_y, cam_pos_z, sun_los_x, sun_los_y, sun_los_z,
+               cam_los_x, cam_los_y, cam_los_z, fov_x_rad, fov_y_rad, ncols
+        FROM lunar_images
+        ''')
+        rows = self.cursor.fetchall()
+        if not rows:
+            return 0
+
+        values = np.array([tuple(row) for row in rows], dtype=np.float64)
+        derived = _derived_geometry(values[:, 1:4], values[:, 4:7], values[:, 7:10],
+                                    values[:, 10], values[:, 11], values[:, 12])
+
+        with self.connection:
+            self.cursor.executemany(f'''
+            UPDATE lunar_images SET {", ".join(f"{name} = ?" for name in _LUNAR_IMAGE_DERIVED_COLUMNS)}
+            WHERE id = ?
+            ''', [extra + (row["id"],) for row, extra in zip(rows, derived)])
+        return len(rows)
+
+    def _migrate_vector_columns(self):
+        """Rebuild lunar_images with numeric x/y/z columns in place of the old str(list) TEXT columns.
+
+        Row ids are kept, so detected_craters.image_id stays valid.
+        """
+        with self.connection:
+            self.cursor.execute("DROP TABLE IF EXISTS lunar_images_new")
+            self.cursor.execute(_lunar_images_table_sql("lunar_images_new"))
+
+            self.cursor.execute('''
+            SELECT id, folder_num, image_num, png_path, json_path, time_s, sun_los, cam_pos_m,
+                   cam_quat_s, cam_quat_v, cam_los, fov_x_rad, fov_y_rad, nrows, ncols
+            FROM lunar_images
+            ''')
+            rows = [
+                (row["id"], row["folder_num"], row["image_num"], row["png_path"], row["json_path"],
+                 _to_float(row["time_s"]),
+                 *_vector3(row["sun_los"]),
+                 *_vector3(row["cam_pos_m"]),
+                 row["cam_quat_s"],
+                 *_vector3(row["cam_quat_v"]),
+                 *_vector3(row["cam_los"]),
+                 row["fov_x_rad"], row["fov_y_rad"], row["nrows"], row["ncols"])
+                for row in self.cursor.fetchall()
+            ]
+
+            self.cursor.executemany(f'''
+            INSERT INTO lunar_images_new (id, {", ".join(_LUNAR_IMAGE_DATA_COLUMNS)})
+            VALUES ({_placeholders(len(_LUNAR_IMAGE_DATA_COLUMNS) + 1)})
+            ''', rows)
+
+            self.cursor.execute("DROP TABLE lunar_images")
+            self.cursor.execute("ALTER TABLE lunar_images_new RENAME TO lunar_images")
+
+    def _rebuild_footprint_index(self):
+        """Refill lunar_image_footprints from the footprint columns of lunar_images"""
+        self.cursor.execute('''
+        SELECT id, footprint_lat, footprint_lon, footprint_radius_deg FROM lunar_images
+        WHERE footprint_lat IS NOT NULL AND footprint_lon IS NOT NULL AND footprint_radius_deg IS NOT NULL
+        ''')
+        rows = self.cursor.fetchall()
+        boxes = _footprint_boxes(rows, key_columns=("id",))
+
+        with self.connection:
+            self.cursor.execute("DELETE FROM lunar_image_footprints")
+            self.cursor.executemany('''
+            INSERT INTO lunar_image_footprints (min_lat, max_lat, min_lon, max_lon, id) VALUES (?, ?, ?, ?, ?)
+            ''', boxes)
+
+    def import_mcad_data(self, base_path="/Users/joshuajackson/PycharmProjects/mcad/data/original/mcad_moon_data",
+                         max_workers=8, batch_size=500, resume=True, force=False):
+        """Import all JSON and PNG files from the mcad_moon_data directory
+
+        The import is incremental: every source file's mtime, size and (for JSON) content hash is kept in
+        source_manifest, so only new or changed files are read again and rows whose files vanished are
+        deleted along with their detected craters. Pass force=True to re-read everything.
+
+        Folders are scanned on a thread pool while the main thread writes with executemany, batch_size
+        changes per transaction. Each finished folder is checkpointed in the same transaction as its
+        changes, so an interrupted import picks up where it stopped (pass resume=False to start over).
+        Returns the number of images written.
+        """
         base_path = Path(base_path)
+        # A missing data directory would otherwise look like every image had been deleted
+        if not base_path.is_dir():
+            raise FileNotFoundError(f"Data directory not found: {base_path}")
+
+        if not resume:
+            self.cursor.execute("DELETE FROM import_checkpoints")
+            self.connection.commit()
+
+        self.cursor.execute("SELECT folder_num FROM import_checkpoints")
+        completed = {row[0] for row in self.cursor.fetchall()}
+        if completed:
+            print(f"Resuming import: skipping {len(completed)} already imported folders")
+
+        self.cursor.execute("SELECT folder_num, image_num, kind, path, mtime_ns, size, content_hash FROM source_manifest")
+        manifest = {(row[0], row[1], row[2]): tuple(row)[3:] for row in self.cursor.fetchall()}
+
+        self.cursor.execute("SELECT folder_num, image_num FROM lunar_images")
+        existing = {}
+        for folder_num, image_num in self.cursor.fetchall():
+            existing.setdefault(folder_num, set()).add(image_num)
 
         # Loop through all folders (000-275)
-        for folder_num in range(276):
-            folder_name = f"{folder_num:03d}"
-            folder_path = base_path / folder_name
+        folder_nums = [folder_num for folder_num in range(276) if folder_num not in completed]
 
-            if not folder_path.exists():
-                print(f"Warning: Folder {folder_name} does not exist. Skipping.")
-                continue
+        written = unchanged = removed = errors = 0
+        batch = _ImportBatch()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # map() yields in folder order while later folders are still being scanned
+            folders = pool.map(lambda folder_num: _scan_image_folder(base_path, folder_num, manifest, force),
+                               folder_nums)
+
+            for folder_num, (rows, manifest_records, present, warnings, failed) in zip(folder_nums, folders):
+                for warning in warnings:
+                    print(warning)
+
+                vanished = existing.get(folder_num, set()).difference(present or ())
+                batch.rows.extend(rows)
+                batch.manifest_records.extend(manifest_records)
+                batch.deleted.extend((folder_num, image_num) for image_num in sorted(vanished))
+                batch.folders.append((folder_num, len(present or ())))
+
+                written += len(rows)
+                unchanged += len(present or ()) - len(rows) - failed
+                removed += len(vanished)
+                errors += failed
+
+                if batch.size() >= batch_size:
+                    self._write_import_batch(batch)
+                    print(f"Imported up to folder {folder_num:03d} ({written} images written)")
+                    batch = _ImportBatch()
 
-            # Max files is 10 per folder (0-9), except folder 275 which has 7
-            max_files = 7 if folder_num == 275 else 10
-
-            # Process each image in the folder
-            for image_num in range(max_files):
-                json_filename = f"image_{image_num}.json"
-                png_filename = f"image_{image_num}.png"
-
-                json_path = folder_path / json_filename
-                png_path = folder_path / png_filename
-
-                # Check if both files exist
-                if not json_path.exists() or not png_path.exists():
-                    print(f"Warning: Missing file(s) for folder {folder_name}, image {image_num}. Skipping.")
-                    continue
-
-                # Load JSON data
-                try:
-                    with open(json_path, 'r') as f:
-                        json_data = json.load(f)
-
-                    # Insert record into database
-                    self.cursor.execute('''
-                    INSERT OR REPLACE INTO lunar_images (
-                        folder_num, image_num, png_path, json_path, 
-                        time_s, sun_los, cam_pos_m, cam_quat_s, cam_quat_v, 
-                        cam_los, fov_x_rad, fov_y_rad, nrows, ncols
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        folder_num,
-                        image_num,
-                        str(png_path),
-                        str(json_path),
-                        json_data.get("Time (s)"),
-                        str(json_data.get("SUN LoS")),
-                        str(json_data.get("Cam Pos (m)")),
-                        json_data.get("Cam Quat (s)"),
-                        str(json_data.get("Cam Quat (v)")),
-                        str(json_data.get("Cam LoS")),
-                        json_data.get("FOV X (rad)"),
-                        json_data.get("FOV Y (rad)"),
-                        json_data.get("Nrows"),
-                        json_data.get("Ncols")
-                    ))
-
-                    if (folder_num * 10 + image_num) % 100 == 0:
-                        print(f"Imported {folder_num:03d}/image_{image_num}")
-                        self.connection.commit()  # Commit every 100 records
-
-                except Exception as e:
-                    print(f"Error processing {json_path}: {e}")
-
-        # Final commit
+        if batch.folders:
+            self._write_import_batch(batch)
+
+        # The run finished, so the next import starts from the first folder again
+        self.cursor.execute("DELETE FROM import_checkpoints")
         self.connection.commit()
-        print("Import complete!")
+
+        # Fresh statistics let the planner choose between the search indexes and the (folder, image) order
+        if written or removed:
+            self.cursor.execute("ANALYZE lunar_images")
+        print(f"Import complete! {written} written, {unchanged} unchanged, {removed} removed, {errors} errors")
+        return written
+
+    def _write_import_batch(self, batch):
+        """Write one batch of import changes and checkpoint its folders in a single transaction"""
+        # Deleted images lose their id and re-imported ones may get a new m_per_px; the dataset version
+        # bumped below makes _resolve_images() drop its cached ids
+        with self.connection:
+            # Upsert rather than INSERT OR REPLACE so existing rows keep their id
+            # (detected_craters.image_id points at it)
+            columns = _LUNAR_IMAGE_DATA_COLUMNS + _LUNAR_IMAGE_DERIVED_COLUMNS
+            rows = _with_derived_geometry(batch.rows)
+            self.cursor.executemany(f'''
+            INSERT INTO lunar_images ({", ".join(columns)})
+            VALUES ({_placeholders(len(columns))})
+            ON CONFLICT(folder_num, image_num) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in columns[2:])}
+            ''', rows)
+
+            # Keep the spatial index in step with the rows just written
+            footprints = [dict(zip(columns, row)) for row in rows]
+            self.cursor.executemany('''
+            DELETE FROM lunar_image_footprints WHERE id IN (
+                SELECT id FROM lunar_images WHERE folder_num = ? AND image_num = ?
+            )
+            ''', [(row["folder_num"], row["image_num"]) for row in footprints])
+            self.cursor.executemany('''
+            INSERT INTO lunar_image_footprints (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT id, ?, ?, ?, ? FROM lunar_images WHERE folder_num = ? AND image_num = ?
+            ''', _footprint_boxes(
+                [row for row in footprints if row["footprint_lat"] is not None and row["footprint_lon"] is not None
+                 and row["footprint_radius_deg"] is not None],
+                key_columns=("folder_num", "image_num")))
+
+            self.cursor.executemany('''
+            INSERT OR REPLACE INTO source_manifest (
+                folder_num, image_num, kind, path, mtime_ns, size, content_hash
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', batch.manifest_records)
+
+            # Images whose source files are gone
+            self.cursor.executemany('''
+            DELETE FROM crater_size_bins WHERE image_id IN (
+                SELECT id FROM lunar_images WHERE folder_num = ? AND image_num = ?
+            )
+            ''', batch.deleted)
+            self.cursor.executemany('''
+            DELETE FROM detected_craters WHERE image_id IN (
+                SELECT id FROM lunar_images WHERE folder_num = ? AND image_num = ?
+            )
+            ''', batch.deleted)
+            self.cursor.executemany('''
+            DELETE FROM lunar_image_footprints WHERE id IN (
+                SELECT id FROM lunar_images WHERE folder_num = ? AND image_num = ?
+            )
+            ''', batch.deleted)
+            self.cursor.executemany("DELETE FROM lunar_images WHERE folder_num = ? AND image_num = ?", batch.deleted)
+            self.cursor.executemany("DELETE FROM source_manifest WHERE folder_num = ? AND image_num = ?", batch.deleted)
+
+            self.cursor.executemany('''
+            INSERT OR REPLACE INTO import_checkpoints (folder_num, image_count) VALUES (?, ?)
+            ''', batch.folders)
+
+            if batch.rows or batch.deleted:
+                self._bump_dataset_version()
+
+    def _bump_dataset_version(self):
+        """Mark lunar_images as changed (inside the caller's transaction)"""
+        self.cursor.execute('''
+        INSERT INTO dataset_info (key, value) VALUES ('lunar_images_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''')
+
+    def dataset_version(self):
+        """Number that changes whenever an import adds, changes or removes lunar_images rows"""
+        self.cursor.execute("SELECT value FROM dataset_info WHERE key = 'lunar_images_version'")
+        row = self.cursor.fetchone()
+        return row["value"] if row else 0
+
+    def get_manifest(self):
+        """Every imported image with its key metadata, as columns (one list per field) in folder/image order"""
+        self.cursor.execute('''
+        SELECT folder_num, image_num, png_path, time_s, altitude_m, m_per_px, sun_angle_deg,
+               footprint_lat, footprint_lon, nrows, ncols
+        FROM lunar_images
+        ORDER BY folder_num, image_num
+        ''')
+        rows = self.cursor.fetchall()
+        columns = {
+            "folder_num": [row["folder_num"] for row in rows],
+            "image_num": [row["image_num"] for row in rows],
+            # Just the file name: the GUI and the file endpoints address images as <folder>/<file name>
+            "file_name": [os.path.basename(row["png_path"]) for row in rows],
+        }
+        for name in ("time_s", "altitude_m", "m_per_px", "sun_angle_deg", "footprint_lat", "footprint_lon",
+                     "nrows", "ncols"):
+            columns[name] = [row[name] for row in rows]
+        return columns
 
     def add_crater_detection(self, folder_num, image_num, crater_data):
         """Add crater detection results for a specific lunar image"""
-        # First, get the image_id
-        self.cursor.execute('''
-        SELECT id FROM lunar_images 
-        WHERE folder_num = ? AND image_num = ?
-        ''', (folder_num, image_num))
+        return self.add_crater_detections(
+            {**crater, "folder_num": folder_num, "image_num": image_num} for crater in crater_data
+        )
 
-        result = self.cursor.fetchone()
-        if not result:
-            raise ValueError(f"Image not found: folder {folder_num}, image {image_num}")
+    def add_crater_detections(self, detections, chunk_size=10000):
+        """Add crater detections for any number of images in one transaction
 
-        image_id = result[0]
+        detections is an iterable of dicts with folder_num, image_num, center_x, center_y and
+        diameter_pixels, plus optional diameter_meters, diameter_miles and confidence_score. Missing
+        diameters are filled in from the image's precomputed meters per pixel. Rows are written with
+        executemany, chunk_size at a time, so the iterable can be a stream of millions of detections.
+        Raises ValueError (and writes nothing) if any detection refers to an unknown image.
+        """
+        inserted = 0
+        with self.connection:
+            chunk = []
+            for detection in detections:
+                chunk.append(detection)
+                if len(chunk) >= chunk_size:
+                    inserted += self._insert_crater_chunk(chunk)
+                    chunk = []
+            if chunk:
+                inserted += self._insert_crater_chunk(chunk)
+        return inserted
 
-        # Add each crater
-        for crater in crater_data:
-            self.cursor.execute('''
-            INSERT INTO detected_craters (
-                image_id, center_x, center_y, diameter_pixels,
-                diameter_meters, diameter_miles, confidence_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+    def _insert_crater_chunk(self, chunk):
+        """Resolve image ids for a chunk of detections and insert them (inside the caller's transaction)"""
+        images = self._resolve_images({(d["folder_num"], d["image_num"]) for d in chunk})
+
+        rows = []
+        for crater in chunk:
+            key = (crater["folder_num"], crater["image_num"])
+            if key not in images:
+                raise ValueError(f"Image not found: folder {key[0]}, image {key[1]}")
+            image_id, m_per_px = images[key]
+
+            diameter_meters = crater.get("diameter_meters")
+            if diameter_meters is None:
+                if m_per_px is None:
+                    raise ValueError(f"No diameter_meters given and no camera geometry for folder {key[0]}, image {key[1]}")
+                diameter_meters = crater["diameter_pixels"] * m_per_px
+            diameter_miles = crater.get("diameter_miles")
+            if diameter_miles is None:
+                diameter_miles = diameter_meters * METERS_TO_MILES
+
+            rows.append((
                 image_id,
-                crater['center_x'],
-                crater['center_y'],
-                crater['diameter_pixels'],
-                crater['diameter_meters'],
-                crater['diameter_miles'],
-                crater.get('confidence_score')
+                crater["center_x"],
+                crater["center_y"],
+                crater["diameter_pixels"],
+                diameter_meters,
+                diameter_miles,
+                crater.get("confidence_score")
             ))
 
-        self.connection.commit()
-        return len(crater_data)
+        self.cursor.executemany('''
+        INSERT INTO detected_craters (
+            image_id, center_x, center_y, diameter_pixels,
+            diameter_meters, diameter_miles, confidence_score
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        self._add_to_crater_size_bins([row[0] for row in rows], [row[4] for row in rows])
+        return len(rows)
+
+    def _add_to_crater_size_bins(self, image_ids, diameters_m):
+        """Fold newly inserted craters into crater_size_bins (inside the caller's transaction)"""
+        images, bins, counts = count_by_bin(image_ids, size_bin_index(np.array(diameters_m, dtype=np.float64)))
+        self.cursor.executemany('''
+        INSERT INTO crater_size_bins (image_id, bin_index, crater_count) VALUES (?, ?, ?)
+        ON CONFLICT(image_id, bin_index) DO UPDATE SET crater_count = crater_count + excluded.crater_count
+        ''', zip(images.tolist(), bins.tolist(), counts.tolist()))
+
+    def refresh_crater_size_bins(self, chunk_size=100000):
+        """Rebuild crater_size_bins from detected_craters, reading it in chunks. Returns the crater count"""
+        total = 0
+        with self.connection:
+            self.cursor.execute("DELETE FROM crater_size_bins")
+            reader = self.connection.execute("SELECT image_id, diameter_meters FROM detected_craters")
+            while True:
+                chunk = reader.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                self._add_to_crater_size_bins([row[0] for row in chunk], [row[1] for row in chunk])
+                total += len(chunk)
+        return total
+
+    def _crater_scope_sql(self, folder_num=None, image_ids=None, alias="t"):
+        """WHERE clause and params restricting a table with an image_id column to a folder or set of images"""
+        conditions, params = [], []
+        if folder_num is not None:
+            conditions.append(f"{alias}.image_id IN (SELECT id FROM lunar_images WHERE folder_num = ?)")
+            params.append(folder_num)
+        if image_ids is not None:
+            # One JSON parameter however many images are in scope
+            conditions.append(f"{alias}.image_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(image_ids)))
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def crater_size_frequency(self, folder_num=None, image_ids=None, edges=None, chunk_size=100000):
+        """Crater size-frequency distribution for the whole dataset, one folder and/or a set of image ids
+
+        Without edges, counts come straight from crater_size_bins (sqrt(2) bins, a GROUP BY over the
+        summary table). With edges (ascending diameters in meters) the matching diameter_meters values are
+        read in chunks and histogrammed with NumPy. Returns a dict of columns: bin_lower_m, bin_upper_m,
+        count and cumulative_count (craters at least as large as bin_lower_m).
+        """
+        where, params = self._crater_scope_sql(folder_num, image_ids)
+
+        if edges is None:
+            self.cursor.execute(f'''
+            SELECT bin_index, SUM(crater_count) AS crater_count
+            FROM crater_size_bins t{where}
+            GROUP BY bin_index
+            ORDER BY bin_index
+            ''', params)
+            rows = self.cursor.fetchall()
+            bin_index = np.array([row["bin_index"] for row in rows], dtype=np.int64)
+            counts = np.array([row["crater_count"] for row in rows], dtype=np.int64)
+            lower, upper = size_bin_edges(bin_index)
+        else:
+            edges = np.asarray(edges, dtype=np.float64)
+            reader = self.connection.execute(f"SELECT diameter_meters FROM detected_craters t{where}", params)
+
+            def diameter_chunks():
+                while True:
+                    chunk = reader.fetchmany(chunk_size)
+                    if not chunk:
+                        return
+                    yield np.fromiter((row[0] for row in chunk), dtype=np.float64, count=len(chunk))
+
+            counts = histogram_chunks(diameter_chunks(), edges)
+            lower, upper = edges[:-1], edges[1:]
+
+        return {
+            "bin_lower_m": lower.tolist(),
+            "bin_upper_m": upper.tolist(),
+            "count": counts.tolist(),
+            "cumulative_count": cumulative_counts(counts).tolist(),
+            "total": int(counts.sum())
+        }
+
+    def _resolve_images(self, keys):
+        """Map (folder_num, image_num) keys to (image_id, m_per_px), going to the database only for cache misses"""
+        # Read before the lookups, so rows fetched across a concurrent import are cached under the old version
+        version = self.dataset_version()
+        with self._image_cache_lock:
+            if version != self._image_cache_version:
+                self._image_cache.clear()
+                self._image_cache_version = version
+            images = {key: self._image_cache[key] for key in keys if key in self._image_cache}
+        missing = [key for key in keys if key not in images]
+
+        # Bounded IN lists stay under SQLite's host parameter limit
+        found = {}
+        for start in range(0, len(missing), 400):
+            part = missing[start:start + 400]
+            self.cursor.execute(f'''
+            SELECT folder_num, image_num, id, m_per_px FROM lunar_images
+            WHERE (folder_num, image_num) IN (VALUES {", ".join(["(?, ?)"] * len(part))})
+            ''', [value for key in part for value in key])
+            for row in self.cursor.fetchall():
+                found[(row["folder_num"], row["image_num"])] = (row["id"], row["m_per_px"])
+
+        if found:
+            with self._image_cache_lock:
+                if self._image_cache_version == version:
+                    self._image_cache.update(found)
+        images.update(found)
+        return images
 
     def get_image_data(self, folder_num, image_num):
         """Get image data and path information for a specific image"""
         self.cursor.execute('''
-        SELECT id, png_path, json_path, time_s, sun_los, cam_pos_m,
-               cam_quat_s, cam_quat_v, cam_los, fov_x_rad, fov_y_rad,
-               nrows, ncols
+        SELECT id, png_path, json_path, time_s,
+               sun_los_x, sun_los_y, sun_los_z,
+               cam_pos_x, cam_pos_y, cam_pos_z,
+               cam_quat_s, cam_quat_v_x, cam_quat_v_y, cam_quat_v_z,
+               cam_los_x, cam_los_y, cam_los_z,
+               fov_x_rad, fov_y_rad, nrows, ncols
         FROM lunar_images
         WHERE folder_num = ? AND image_num = ?
         ''', (folder_num, image_num))
 
         return self.cursor.fetchone()
 
-    def get_craters_for_image(self, folder_num, image_num):
-        """Get all detected craters for a specific image"""
-        # First, get the image_id
+    def get_image_geometry(self, folder_num, image_num):
+        """Get the precomputed altitude, ground footprint and meters per pixel for a specific image"""
         self.cursor.execute('''
-        SELECT id FROM lunar_images 
+        SELECT id, altitude_m, image_width_m, image_height_m, m_per_px, nrows, ncols
+        FROM lunar_images
         WHERE folder_num = ? AND image_num = ?
         ''', (folder_num, image_num))
 
-        result = self.cursor.fetchone()
-        if not result:
+        return self.cursor.fetchone()
+
+    def get_craters_for_image(self, folder_num, image_num, min_diameter_pixels=None, min_confidence=None):
+        """Get all detected craters for a specific image, largest first
+
+        min_diameter_pixels stops the index scan early; min_confidence is checked from the same index.
+        """
+        # First, get the image_id
+        image = self._resolve_images({(folder_num, image_num)}).get((folder_num, image_num))
+        if image is None:
             return []
 
-        image_id = result[0]
+        image_id = image[0]
 
-        # Get all craters for this image
-        self.cursor.execute('''
-        SELECT center_x, center_y, diameter_pixels, diameter_meters, 
+        query = '''
+        SELECT center_x, center_y, diameter_pixels, diameter_meters,
                diameter_miles, confidence_score, detection_date
         FROM detected_craters
-        WHERE image_id = ?
-        ORDER BY diameter_pixels DESC
-        ''', (image_id,))
+        WHERE image_id = ?'''
+        params = [image_id]
+
+        if min_diameter_pixels is not None:
+            query += " AND diameter_pixels >= ?"
+            params.append(min_diameter_pixels)
+
+        if min_confidence is not None:
+            query += " AND confidence_score >= ?"
+            params.append(min_confidence)
 
+        # Get all craters for this image
+        query += " ORDER BY diameter_pixels DESC"
+        self.cursor.execute(query, params)
+
+        return self.cursor.fetchall()
+
+    def get_craters_by_size(self, min_diameter_m=None, max_diameter_m=None, min_confidence=None, limit=1000):
+        """Get detected craters across all images within a diameter range (meters), smallest first
+
+        CROSS JOIN keeps detected_craters as the outer loop, so the diameter index drives the query.
+        """
+        query = '''
+        SELECT i.folder_num, i.image_num, c.center_x, c.center_y, c.diameter_pixels,
+               c.diameter_meters, c.diameter_miles, c.confidence_score
+        FROM detected_craters c
+        CROSS JOIN lunar_images i ON i.id = c.image_id
+        WHERE 1=1'''
+        params = []
+
+        if min_diameter_m is not None:
+            query += " AND c.diameter_meters >= ?"
+            params.append(min_diameter_m)
+
+        if max_diameter_m is not None:
+            query += " AND c.diameter_meters <= ?"
+            params.append(max_diameter_m)
+
+        if min_confidence is not None:
+            query += " AND c.confidence_score >= ?"
+            params.append(min_confidence)
+
+        query += " ORDER BY c.diameter_meters LIMIT ?"
+        params.append(limit)
+
+        self.cursor.execute(query, params)
         return self.cursor.fetchall()
 
+    def get_craters_above_confidence(self, min_confidence, limit=1000):
+        """Get detected craters across all images with a confidence score of at least min_confidence, best first"""
+        self.cursor.execute('''
+        SELECT i.folder_num, i.image_num, c.center_x, c.center_y, c.diameter_pixels,
+               c.diameter_meters, c.diameter_miles, c.confidence_score
+        FROM detected_craters c
+        CROSS JOIN lunar_images i ON i.id = c.image_id
+        WHERE c.confidence_score >= ?
+        ORDER BY c.confidence_score DESC
+        LIMIT ?
+        ''', (min_confidence, limit))
+
+        return self.cursor.fetchall()
+
+    def search_images(self, filters=None, after=None, limit=100):
+        """Search lunar_images with range filters and keyset pagination
+
+        filters maps "min_<column>" / "max_<column>" to a bound, where column is one of time_s, altitude_m,
+        sun_angle_deg, m_per_px (resolution) and cam_pos_x/y/z (a camera position bounding box); None bounds
+        are ignored. Results are ordered by (folder_num, image_num); pass the last (folder_num, image_num)
+        of a page as after to get the next one, which stays an index seek however deep the page is.
+        Returns (rows, next_after) where next_after is None on the last page.
+        """
+        query = '''
+        SELECT folder_num, image_num, png_path, time_s, altitude_m, image_width_m, image_height_m,
+               m_per_px, sun_angle_deg, cam_pos_x, cam_pos_y, cam_pos_z, nrows, ncols
+        FROM lunar_images WHERE 1=1'''
+        params = []
+
+        for key, value in (filters or {}).items():
+            bound, _, name = key.partition("_")
+            if value is None:
+                continue
+            if bound not in ("min", "max") or name not in _SEARCH_RANGE_COLUMNS:
+                raise ValueError(f"Unknown search filter: {key}")
+            query += f" AND {_SEARCH_RANGE_COLUMNS[name]} {'>=' if bound == 'min' else '<='} ?"
+            params.append(value)
+
+        if after is not None:
+            query += " AND (folder_num, image_num) > (?, ?)"
+            params.extend(after)
+
+        # One extra row tells us whether there is another page
+        query += " ORDER BY folder_num, image_num LIMIT ?"
+        params.append(limit + 1)
+
+        self.cursor.execute(query, params)
+        rows = self.cursor.fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, (rows[-1]["folder_num"], rows[-1]["image_num"])
+        return rows, None
+
+    def _footprint_candidates(self, min_lat, max_lat, min_lon, max_lon):
+        """Images whose footprint bounding box overlaps a lat/lon box, via the R*Tree.
+
+        Boxes on either side may run past +/-180 degrees longitude, so the query box is also tried shifted
+        by 360 degrees each way.
+        """
+        box_query = "SELECT id FROM lunar_image_footprints WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?"
+        params = []
+        for shift in (-360.0, 0.0, 360.0):
+            params.extend((min_lat, max_lat, min_lon + shift, max_lon + shift))
+
+        self.cursor.execute(f'''
+        SELECT id, folder_num, image_num, png_path, altitude_m, m_per_px, sun_angle_deg,
+               footprint_lat, footprint_lon, footprint_radius_deg
+        FROM lunar_images
+        WHERE id IN ({" UNION ".join([box_query] * 3)})
+        ''', params)
+        return self.cursor.fetchall()
+
+    def find_images_covering(self, lat, lon, radius_m=0.0, limit=1000):
+        """Images whose footprint covers a lunar lat/lon point, or comes within radius_m of it
+
+        Candidates come from the R*Tree and are then checked against the footprint circle.
+        Returns dicts ordered by distance from the point (distance_deg, between footprint centers).
+        """
+        lon = float(normalize_longitude(lon))
+        radius_deg = float(np.degrees(radius_m / MOON_RADIUS))
+        min_lat, max_lat, min_lon, max_lon = (float(v) for v in bounding_boxes(lat, lon, radius_deg))
+        candidates = self._footprint_candidates(min_lat, max_lat, min_lon, max_lon)
+        if not candidates:
+            return []
+
+        distance = angular_distance_deg(
+            lat, lon,
+            np.array([row["footprint_lat"] for row in candidates]),
+            np.array([row["footprint_lon"] for row in candidates])
+        )
+        reach = np.array([row["footprint_radius_deg"] for row in candidates]) + radius_deg
+
+        matches = [
+            {**dict(row), "distance_deg": float(d)}
+            for row, d, r in zip(candidates, distance, reach) if d <= r
+        ]
+        matches.sort(key=lambda match: match["distance_deg"])
+        return matches[:limit]
+
+    def find_images_in_box(self, min_lat, max_lat, min_lon, max_lon, limit=1000):
+        """Images whose footprint bounding box overlaps a lat/lon box
+
+        min_lon > max_lon means the box crosses the antimeridian.
+        """
+        if max_lon - min_lon >= 360.0:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon, max_lon = float(normalize_longitude(min_lon)), float(normalize_longitude(max_lon))
+            if min_lon > max_lon:
+                max_lon += 360.0
+        rows = self._footprint_candidates(min_lat, max_lat, min_lon, max_lon)
+        rows.sort(key=lambda row: (row["folder_num"], row["image_num"]))
+        return [dict(row) for row in rows[:limit]]
+
     def search_images_by_criteria(self, min_fov=None, max_fov=None, limit=10):
         """Search for images based on criteria like field of view"""
         query = "SELECT folder_num, image_num, png_path, fov_x_rad, fov_y_rad FROM lunar_images WHERE 1=1"
@@ -226,8 +1209,18 @@ class MCADDatabase:
         return self.cursor.fetchall()
 
     def close(self):
-        """Close the database connection"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            self.cursor = None
\ No newline at end of file
+        """Close every thread's database connection"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for i, connection in enumerate(connections):
+            if i == 0:
+                # Lets SQLite refresh the planner statistics the search indexes rely on, when needed
+                connection.execute("PRAGMA optimize")
+            connection.close()
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        # Threads that use this object again get a fresh connection
+        self._local = threading.local()
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+In-process LRU cache for small, mostly immutable responses (JSON metadata, directory listings).
+
+Entries are validated against the source path's stat (mtime, size, inode) on every lookup, so editing a
+JSON file or adding an image to a folder is picked up on the next request; the stat is the only I/O a
+hit costs. The cache is bounded both by entry count and by total bytes, evicting least recently used
+entries first, and counts hits, misses, invalidations and evictions for the stats endpoint.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+def path_validator(path):
+    """Version of a file or directory as seen by stat(); raises FileNotFoundError"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class MetadataCache:
+    """Thread-safe LRU of key -> (validator, value, size in bytes)"""
+
+    def __init__(self, max_entries=20000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def lookup(self, key, validator):
+        """Cached value for key if it was stored with the same validator, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == validator:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[1]
+                # The source changed since it was cached
+                self._remove(key)
+                self._counters["invalidations"] += 1
+            self._counters["misses"] += 1
+            return None
+
+    def store(self, key, validator, value, size):
+        """Cache value (size bytes) for key; values larger than a quarter of the budget are not kept"""
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (validator, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,43 @@
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules are imported as top-level modules (the server runs from app/backend)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from image_streaming import CHUNK_SIZE, bundle_entries, iter_bundle, read_bundle
+
+
+def test_bundle_round_trip(tmp_path):
+    images = {
+        "image_0.png": (b"\x89PNG small", {"Cam Pos (m)": [1.0, 2.0, 3.0]}),
+        "image_1.png": (bytes(range(256)) * (CHUNK_SIZE // 128 + 1), None),  # Several chunks, no JSON file
+        "image_2.png": (b"", {"FOV (rad)": 0.35}),
+    }
+    for name, (png, metadata) in images.items():
+        (tmp_path / name).write_bytes(png)
+        if metadata is not None:
+            (tmp_path / name).with_suffix(".json").write_text(json.dumps(metadata))
+
+    entries, etag = bundle_entries([tmp_path / name for name in images])
+    records = list(read_bundle(io.BytesIO(b"".join(iter_bundle(entries)))))
+
+    assert records == [(name, metadata, png) for name, (png, metadata) in images.items()]
+    assert etag.startswith('"')
+
+    entries, _ = bundle_entries([tmp_path / "image_0.png"], include_json=False)
+    assert list(read_bundle(io.BytesIO(b"".join(iter_bundle(entries))))) == [("image_0.png", None, b"\x89PNG small")]
+
+
+def test_truncated_bundle_is_rejected(tmp_path):
+    (tmp_path / "image_0.png").write_bytes(b"\x89PNG data")
+    entries, _ = bundle_entries([tmp_path / "image_0.png"])
+    stream = b"".join(iter_bundle(entries))
+
+    with pytest.raises(ValueError):
+        list(read_bundle(io.BytesIO(stream[:-5])))
+    with pytest.raises(ValueError):
+        list(read_bundle(io.BytesIO(b"NOTABUNDLE")))
@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+# The backend modules are imported as top-level modules (the server runs from app/backend)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mcad_database_setup import MCADDatabase
+
+
+def test_crater_queries_use_their_indexes(tmp_path):
+    db = MCADDatabase(tmp_path / "mcad.db")
+    try:
+        checks = db.check_query_plans()
+    finally:
+        db.close()
+
+    assert checks
+    for name, ok, plan in checks:
+        assert ok, f"{name} does not use its index: {plan}"
+        # "SCAN x" without "USING ... INDEX" is a full table scan
+        assert not any(step.startswith("SCAN") and "INDEX" not in step for step in plan), \
+            f"{name} scans a whole table: {plan}"
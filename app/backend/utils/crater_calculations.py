@@ -6,25 +6,67 @@ This script computes the camera's altitude (distance from the lunar surface) usi
 It computes the real-world width and height of the area captured in the image.
 Also, this script defines a function to convert crater size from pixels to meters.
 If a crater spans 50 pixels, it calculates its real-world size in meters.
+
+All three functions work on single values or on whole arrays (N camera positions, N craters) at once.
+Pass out= to write into preallocated arrays and dtype= (np.float32 or np.float64) to control precision;
+when out is given its dtype is used.
 """
 import numpy as np
 
 MOON_RADIUS = 1737400  # meters
 
-def compute_camera_altitude(cam_pos):
-    """Compute camera altitude above the lunar surface."""
-    distance_from_center = np.linalg.norm(cam_pos)
-    return distance_from_center - MOON_RADIUS
 
-def compute_image_dimensions(altitude, fov_x, fov_y):
-    """Compute the width and height of the lunar surface captured in the image."""
-    image_width_m = 2 * altitude * np.tan(fov_x / 2)
-    image_height_m = 2 * altitude * np.tan(fov_y / 2)
+def _result_dtype(out, dtype):
+    """Pick the working dtype: explicit dtype, else the out buffer's, else float64."""
+    if dtype is not None:
+        return np.dtype(dtype)
+    if out is not None:
+        return out.dtype
+    return np.dtype(np.float64)
+
+def compute_camera_altitude(cam_pos, out=None, dtype=None):
+    """Compute camera altitude above the lunar surface for a (3,) position or an (N, 3) array of them."""
+    cam_pos = np.asarray(cam_pos, dtype=_result_dtype(out, dtype))
+    # Row-wise squared norm without building an (N, 3) temporary
+    squared_distance = np.einsum("...i,...i->...", cam_pos, cam_pos, out=out)
+    if out is None and np.ndim(squared_distance) > 0:
+        out = squared_distance  # Reuse the fresh buffer for the remaining steps
+    distance_from_center = np.sqrt(squared_distance, out=out)
+    return np.subtract(distance_from_center, MOON_RADIUS, out=out)
+
+def compute_image_dimensions(altitude, fov_x, fov_y, out=None, dtype=None):
+    """Compute the width and height of the lunar surface captured in the image.
+
+    altitude, fov_x and fov_y broadcast against each other; out may be a (width, height) pair of arrays.
+    """
+    width_out, height_out = out if out is not None else (None, None)
+    work_dtype = _result_dtype(width_out, dtype)
+    altitude = np.asarray(altitude, dtype=work_dtype)
+    image_width_m = np.multiply(altitude, 2 * np.tan(np.asarray(fov_x, dtype=work_dtype) / 2), out=width_out)
+    image_height_m = np.multiply(altitude, 2 * np.tan(np.asarray(fov_y, dtype=work_dtype) / 2), out=height_out)
     return image_width_m, image_height_m
 
-def crater_diameter_meters(pixel_diameter, image_width_m, image_width_px):
-    """Calculate crater diameter in meters from pixel size."""
-    return pixel_diameter * (image_width_m / image_width_px)
+def crater_diameter_meters(pixel_diameter, image_width_m, image_width_px, out=None, dtype=None):
+    """Calculate crater diameter in meters from pixel size (element-wise for arrays)."""
+    work_dtype = _result_dtype(out, dtype)
+    # Meters per pixel first: usually one value per image, so this stays cheap
+    meters_per_pixel = np.asarray(image_width_m, dtype=work_dtype) / image_width_px
+    return np.multiply(np.asarray(pixel_diameter, dtype=work_dtype), meters_per_pixel, out=out)
+
+def compute_sun_angle(sun_los, cam_pos, out=None, dtype=None):
+    """Angle in degrees between the Sun line of sight and the local vertical beneath the camera.
+
+    Both arguments are (3,) vectors or (N, 3) arrays; neither needs to be normalized.
+    """
+    work_dtype = _result_dtype(out, dtype)
+    sun_los = np.asarray(sun_los, dtype=work_dtype)
+    cam_pos = np.asarray(cam_pos, dtype=work_dtype)
+    dot = np.einsum("...i,...i->...", sun_los, cam_pos, out=out)
+    if out is None and np.ndim(dot) > 0:
+        out = dot  # Reuse the fresh buffer for the remaining steps
+    cos_angle = np.divide(dot, np.linalg.norm(sun_los, axis=-1) * np.linalg.norm(cam_pos, axis=-1), out=out)
+    cos_angle = np.clip(cos_angle, -1.0, 1.0, out=out)
+    return np.degrees(np.arccos(cos_angle, out=out), out=out)
 
 """
 Note: "def compute_camera_altitude(cam_pos)", 
@@ -0,0 +1,65 @@
+"""
+Crater size-frequency distribution (SFD) helpers.
+
+Diameters are binned on the standard sqrt(2) ladder in meters: bin k holds craters with
+2^(k/2) <= D < 2^((k+1)/2). Counts in these bins can be summed across images, which is what lets
+mcad_database_setup keep a per-image summary table up to date as detections are added.
+Arbitrary log-spaced bins are also supported for on-the-fly histograms.
+"""
+import numpy as np
+
+MAX_LOG_BINS = 1000  # Upper bound on custom histogram bins per request
+
+
+def size_bin_index(diameter_m):
+    """sqrt(2) bin index for each diameter (meters); non-positive or missing diameters give -1"""
+    diameter_m = np.asarray(diameter_m, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        index = np.floor(2 * np.log2(diameter_m))
+    return np.where(np.isfinite(index), index, -1).astype(np.int64)
+
+def size_bin_edges(bin_index):
+    """(lower, upper) diameter in meters of sqrt(2) bins"""
+    bin_index = np.asarray(bin_index, dtype=np.float64)
+    return 2 ** (bin_index / 2), 2 ** ((bin_index + 1) / 2)
+
+def log_spaced_edges(min_diameter_m, max_diameter_m, bins_per_decade=10):
+    """Bin edges evenly spaced in log10 from min to max diameter (meters).
+
+    Raises ValueError for a non-finite or empty range, or one needing more than MAX_LOG_BINS bins.
+    """
+    if not (np.isfinite(min_diameter_m) and np.isfinite(max_diameter_m)) \
+            or min_diameter_m <= 0 or max_diameter_m <= min_diameter_m:
+        raise ValueError("Need 0 < min_diameter_m < max_diameter_m, both finite")
+    if bins_per_decade < 1:
+        raise ValueError("bins_per_decade must be at least 1")
+    # Differences of logs, so extreme ratios (1e-300 .. 1e300) cannot overflow
+    low, high = np.log10(min_diameter_m), np.log10(max_diameter_m)
+    bin_count = max(1, int(np.ceil((high - low) * bins_per_decade)))
+    if bin_count > MAX_LOG_BINS:
+        raise ValueError(f"{bin_count} bins requested; at most {MAX_LOG_BINS} (narrow the range or use fewer "
+                         f"bins per decade)")
+    return np.logspace(low, high, bin_count + 1)
+
+def count_by_bin(keys, bin_index):
+    """Count rows per (key, bin) pair: returns (unique keys, unique bins, counts), ignoring bin -1"""
+    keys = np.asarray(keys, dtype=np.int64)
+    bin_index = np.asarray(bin_index, dtype=np.int64)
+    valid = bin_index >= 0
+    pairs = np.column_stack((keys[valid], bin_index[valid]))
+    if not len(pairs):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    unique_pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+    return unique_pairs[:, 0], unique_pairs[:, 1], counts
+
+def histogram_chunks(diameter_chunks, edges):
+    """Histogram a stream of diameter arrays against fixed edges without holding them all in memory"""
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for chunk in diameter_chunks:
+        counts += np.histogram(chunk, bins=edges)[0]
+    return counts
+
+def cumulative_counts(counts):
+    """Cumulative SFD: for each bin, the number of craters at least as large as its lower edge"""
+    return np.cumsum(np.asarray(counts)[::-1])[::-1]
@@ -0,0 +1,88 @@
+"""
+Ground coverage of lunar images on a spherical Moon.
+
+Each image's footprint is approximated by a circle on the sphere: centred where the camera boresight (Cam LoS)
+hits the surface and wide enough to hold the image corners at that slant range. These circles (and their
+lat/lon bounding boxes) feed the spatial index in mcad_database_setup, which answers "which images cover
+this point / area?" queries.
+
+Like crater_calculations, every function works on single values or on whole arrays at once.
+Latitudes and longitudes are in degrees, longitudes in [-180, 180).
+"""
+import numpy as np
+
+from utils.crater_calculations import MOON_RADIUS
+
+# The circle is only exact for a camera looking straight down; pad it for oblique views
+FOOTPRINT_MARGIN = 1.25
+
+
+def latlon_from_vectors(vectors):
+    """Latitude and longitude of Moon-centred (N, 3) vectors"""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    lat = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    lon = np.degrees(np.arctan2(y, x))
+    return lat, normalize_longitude(lon)
+
+def normalize_longitude(lon):
+    """Wrap longitudes into [-180, 180)"""
+    return (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+
+def angular_distance_deg(lat1, lon1, lat2, lon2):
+    """Great-circle angle in degrees between two sets of points (haversine, broadcasts)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))))
+
+def compute_footprints(cam_pos, cam_los, fov_x, fov_y):
+    """Footprint circle (center lat, center lon, angular radius in degrees) for each camera.
+
+    The center is where the boresight meets the surface; when it misses the Moon (or cam_los is missing)
+    the sub-camera point and camera altitude are used instead. Missing inputs give NaN.
+    """
+    cam_pos = np.asarray(cam_pos, dtype=np.float64).reshape(-1, 3)
+    cam_los = np.asarray(cam_los, dtype=np.float64).reshape(-1, 3)
+    fov_x = np.asarray(fov_x, dtype=np.float64)
+    fov_y = np.asarray(fov_y, dtype=np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        los = cam_los / np.linalg.norm(cam_los, axis=-1, keepdims=True)
+        # Ray-sphere intersection: |cam_pos + t * los| = MOON_RADIUS, nearest t > 0
+        b = np.einsum("...i,...i->...", cam_pos, los)
+        c = np.einsum("...i,...i->...", cam_pos, cam_pos) - MOON_RADIUS ** 2
+        discriminant = b * b - c
+        slant_range = -b - np.sqrt(discriminant)
+        hits = (discriminant >= 0) & (slant_range > 0)
+
+        altitude = np.sqrt(np.einsum("...i,...i->...", cam_pos, cam_pos)) - MOON_RADIUS
+        surface_point = np.where(hits[..., None], cam_pos + slant_range[..., None] * los, cam_pos)
+        distance = np.where(hits, slant_range, altitude)
+
+        half_diagonal_m = distance * np.hypot(np.tan(fov_x / 2), np.tan(fov_y / 2))
+        radius_deg = np.degrees(np.minimum(half_diagonal_m * FOOTPRINT_MARGIN / MOON_RADIUS, np.pi))
+
+    lat, lon = latlon_from_vectors(surface_point)
+    return lat, lon, radius_deg
+
+def bounding_boxes(lat, lon, radius_deg):
+    """Lat/lon bounding box (min_lat, max_lat, min_lon, max_lon) of circles on the sphere.
+
+    Longitudes are not wrapped: a box crossing the antimeridian extends past -180 or 180, and queries
+    compensate by also searching with their box shifted by 360 degrees. Circles that reach a pole span
+    every longitude.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    radius_deg = np.asarray(radius_deg, dtype=np.float64)
+
+    min_lat = np.maximum(lat - radius_deg, -90.0)
+    max_lat = np.minimum(lat + radius_deg, 90.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.sin(np.radians(radius_deg)) / np.cos(np.radians(lat))
+        half_width = np.degrees(np.arcsin(np.clip(ratio, -1.0, 1.0)))
+    covers_pole = (lat + radius_deg >= 90.0) | (lat - radius_deg <= -90.0) | (ratio >= 1.0)
+
+    min_lon = np.where(covers_pole, -180.0, lon - half_width)
+    max_lon = np.where(covers_pole, 180.0, lon + half_width)
+    return min_lat, max_lat, min_lon, max_lon
@@ -0,0 +1,127 @@
+"""
+Crater detections drawn over the image in TiledImageView.
+
+CraterOverlay is one QGraphicsItem for all of an image's detections, not one ellipse item per crater. The
+craters are held as numpy arrays and bucketed into CELL_SIZE grid cells by centre. paint() only visits the
+cells that intersect the exposed rectangle, and each cell is stroked as a single QPainterPath built once
+per filter setting and zoom bucket. Craters narrower than MIN_SCREEN_DIAMETER screen pixels at the
+current zoom are left out of those paths, as are craters below the confidence/diameter filters, so tens
+of thousands of detections pan and zoom at interactive rates.
+"""
+import math
+
+import numpy as np
+from PyQt6.QtCore import QPointF, QRectF, Qt
+from PyQt6.QtGui import QColor, QPainterPath, QPen
+from PyQt6.QtWidgets import QGraphicsItem
+
+CELL_SIZE = 256  # Scene (full-resolution) pixels per grid cell
+MIN_SCREEN_DIAMETER = 3.0  # Craters smaller than this many screen pixels are not drawn
+OVERLAY_Z_VALUE = 100  # Above every tile level
+LARGE_CELL = -1  # Craters wider than a cell are kept apart and always drawn
+
+
+class CraterOverlay(QGraphicsItem):
+    def __init__(self, columns, parent=None):
+        """columns: /craters/image response columns (center_x, center_y, diameter_pixels, ...)"""
+        super().__init__(parent)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+        self.setZValue(OVERLAY_Z_VALUE)
+        self.pen = QPen(QColor(255, 80, 60), 1.5)
+        self.pen.setCosmetic(True)  # Same line width at every zoom
+
+        def column(name, missing):
+            return np.array([missing if value is None else value for value in columns.get(name, [])], dtype=float)
+
+        self.x = column("center_x", 0.0)
+        self.y = column("center_y", 0.0)
+        self.diameter = column("diameter_pixels", 0.0)
+        self.diameter_m = column("diameter_meters", np.nan)
+        self.confidence = column("confidence_score", 1.0)  # Manual entries may have no score
+        self.radius = self.diameter / 2
+
+        if len(self.x):
+            self._bounds = QRectF(QPointF(float((self.x - self.radius).min()), float((self.y - self.radius).min())),
+                                  QPointF(float((self.x + self.radius).max()), float((self.y + self.radius).max())))
+        else:
+            self._bounds = QRectF()
+
+        # Bucket by centre; big craters reach across several cells, so they get their own bucket
+        cell_x = np.floor(self.x / CELL_SIZE).astype(np.int64)
+        cell_y = np.floor(self.y / CELL_SIZE).astype(np.int64)
+        self._cell_origin = (int(cell_x.min()), int(cell_y.min())) if len(self.x) else (0, 0)
+        cells = list(zip((cell_x - self._cell_origin[0]).tolist(), (cell_y - self._cell_origin[1]).tolist()))
+        cells = [LARGE_CELL if radius > CELL_SIZE / 2 else cell for cell, radius in zip(cells, self.radius.tolist())]
+        self._cells = {}
+        for index, cell in enumerate(cells):
+            self._cells.setdefault(cell, []).append(index)
+        self._cells = {cell: np.array(indices) for cell, indices in self._cells.items()}
+
+        self.min_confidence = 0.0
+        self.min_diameter_m = 0.0
+        self._mask = np.ones(len(self.x), dtype=bool)
+        self._paths = {}  # (zoom bucket, cell) -> QPainterPath for the current filters
+        self._paths_bucket = None
+
+    def total_count(self):
+        return len(self.x)
+
+    def set_filters(self, min_confidence=0.0, min_diameter_m=0.0):
+        """Hide craters below a confidence score or a diameter in meters (craters with no meters value only
+        pass when min_diameter_m is 0)"""
+        self.min_confidence = min_confidence
+        self.min_diameter_m = min_diameter_m
+        mask = self.confidence >= min_confidence
+        if min_diameter_m > 0:
+            mask &= np.nan_to_num(self.diameter_m, nan=-1.0) >= min_diameter_m
+        self._mask = mask
+        self._paths.clear()
+        self.update()
+
+    def shown_count(self):
+        """Craters passing the filters (before zoom culling)"""
+        return int(self._mask.sum())
+
+    def boundingRect(self):
+        return self._bounds
+
+    def _cell_path(self, bucket, cell):
+        key = (bucket, cell)
+        path = self._paths.get(key)
+        if path is None:
+            indices = self._cells[cell]
+            # bucket is floor(log2(scale)), so 2 ** bucket never exceeds the real scale
+            min_diameter = MIN_SCREEN_DIAMETER / 2 ** bucket
+            indices = indices[self._mask[indices] & (self.diameter[indices] >= min_diameter)]
+            path = QPainterPath()
+            for x, y, radius in zip(self.x[indices].tolist(), self.y[indices].tolist(), self.radius[indices].tolist()):
+                path.addEllipse(QPointF(x, y), radius, radius)
+            self._paths[key] = path
+        return path
+
+    def paint(self, painter, option, widget=None):
+        if not len(self.x):
+            return
+        scale = option.levelOfDetailFromTransform(painter.worldTransform())
+        if scale <= 0:
+            return
+        bucket = math.floor(math.log2(scale))
+        if bucket != self._paths_bucket:
+            # Only the paths for the current zoom are kept
+            self._paths.clear()
+            self._paths_bucket = bucket
+
+        # Cells whose craters can reach the exposed area (a bucketed crater reaches at most half a cell past its centre)
+        exposed = option.exposedRect.adjusted(-CELL_SIZE / 2, -CELL_SIZE / 2, CELL_SIZE / 2, CELL_SIZE / 2)
+        origin_x, origin_y = self._cell_origin
+        x_range = range(math.floor(exposed.left() / CELL_SIZE) - origin_x,
+                        math.floor(exposed.right() / CELL_SIZE) - origin_x + 1)
+        y_range = range(math.floor(exposed.top() / CELL_SIZE) - origin_y,
+                        math.floor(exposed.bottom() / CELL_SIZE) - origin_y + 1)
+
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        visible_cells = [LARGE_CELL] + [(x, y) for x in x_range for y in y_range]
+        for cell in visible_cells:
+            if cell in self._cells:
+                painter.drawPath(self._cell_path(bucket, cell))
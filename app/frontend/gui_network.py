@@ -0,0 +1,220 @@
+"""
+Background HTTP for the MCAD GUI.
+
+Requests run on a QThreadPool so the Qt UI thread never waits on the backend. Results come back to
+callbacks on the UI thread through queued signals. Every request may carry a tag; submitting a new request
+with replace=True cancels the older ones with the same tag (e.g. the image of the previously selected
+file), so stale responses are dropped instead of overwriting newer ones. Cancelled requests that have not
+started are taken off the queue; running ones stop at the next chunk of the response body.
+
+A request given a DiskCache (see image_cache.py) is revalidated: the stored ETag is sent as If-None-Match
+and a 304 answer is served from the stored bytes; a fresh 200 with an ETag replaces the stored copy.
+
+Image responses are decoded to a QImage on the worker thread (QImage, unlike QPixmap, is safe to use
+off the UI thread), leaving only the cheap QPixmap.fromImage() for the UI thread.
+"""
+import json
+import threading
+
+import requests
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+
+SERVER_URL = "http://127.0.0.1:8000"
+READ_CHUNK_SIZE = 64 * 1024
+
+# One keep-alive session per worker thread (requests.Session is not meant to be shared between threads)
+_thread_state = threading.local()
+
+
+def _session():
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        session = _thread_state.session = requests.Session()
+    return session
+
+
+class Reply:
+    """A finished request: status_code, headers and data parsed as asked ("json", "bytes" or "image").
+
+    from_cache is True when the body came from the disk cache after a 304.
+    """
+
+    def __init__(self, status_code, headers, data, from_cache=False):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+        self.from_cache = from_cache
+
+
+class RequestError:
+    """Why a request failed: kind is "connection", "timeout", "http", "parse" or "error"."""
+
+    def __init__(self, kind, message, status_code=None, text=""):
+        self.kind = kind
+        self.message = message
+        self.status_code = status_code
+        self.text = text
+
+    def __str__(self):
+        return self.message
+
+
+class RequestHandle:
+    def __init__(self, tag):
+        self.tag = tag
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Signals(QObject):
+    # (handle, Reply) / (handle, RequestError), emitted from worker threads
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+
+class _HttpTask(QRunnable):
+    def __init__(self, handle, method, url, parse, timeout, kwargs, signals, cache=None):
+        super().__init__()
+        self.setAutoDelete(False)  # NetworkClient may still tryTake() it
+        self.handle = handle
+        self.method = method
+        self.url = url
+        self.parse = parse
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.signals = signals
+        self.cache = cache
+
+    def run(self):
+        if self.handle.cancelled:
+            return
+        try:
+            kwargs = dict(self.kwargs)
+            cached = self.cache.get(self.url) if self.cache is not None else None
+            if cached is not None:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), "If-None-Match": cached.etag}
+
+            response = _session().request(self.method, self.url, timeout=self.timeout, stream=True, **kwargs)
+            with response:
+                body = bytearray()
+                for chunk in response.iter_content(READ_CHUNK_SIZE):
+                    if self.handle.cancelled:
+                        return
+                    body.extend(chunk)
+
+            from_cache = cached is not None and response.status_code == 304
+            if from_cache:
+                body = cached.body
+            elif self.cache is not None and response.status_code == 200 and response.headers.get("ETag"):
+                self.cache.put(self.url, response.headers["ETag"], bytes(body))
+            if response.status_code >= 400:
+                self.signals.failed.emit(self.handle, RequestError(
+                    "http", f"Server returned status code: {response.status_code}",
+                    response.status_code, body.decode("utf-8", "replace")))
+                return
+            try:
+                data = self._parse(bytes(body))
+            except ValueError as e:
+                self.signals.failed.emit(self.handle, RequestError("parse", str(e), response.status_code))
+                return
+            reply = Reply(200 if from_cache else response.status_code, response.headers, data, from_cache)
+            self.signals.finished.emit(self.handle, reply)
+        except requests.exceptions.ConnectionError:
+            self.signals.failed.emit(self.handle, RequestError(
+                "connection", "Could not connect to the server. Is the API running?"))
+        except requests.exceptions.Timeout:
+            self.signals.failed.emit(self.handle, RequestError("timeout", "Server request timed out"))
+        except Exception as e:
+            self.signals.failed.emit(self.handle, RequestError("error", str(e)))
+
+    def _parse(self, body):
+        if not body or self.parse == "bytes":
+            return body
+        if self.parse == "json":
+            return json.loads(body)
+        if self.parse == "image":
+            image = QImage.fromData(body)
+            if image.isNull():
+                raise ValueError("Could not parse image data")
+            return image, body
+        raise ValueError(f"Unknown parse mode: {self.parse}")
+
+
+class NetworkClient(QObject):
+    """Runs HTTP requests on a thread pool; callbacks run on the thread that owns this object (the UI)"""
+
+    def __init__(self, parent=None, max_threads=6):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        # Workers emit through this object; since the receiver (self) lives on the UI thread,
+        # the connections are queued and the callbacks run there
+        self._signals = _Signals()
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._active = {}  # handle -> (task, on_success, on_error) until delivered or cancelled
+
+    def request(self, method, path, on_success, on_error=None, tag=None, replace=False, parse="json",
+                timeout=15, priority=0, cache=None, **kwargs):
+        """Queue a request for SERVER_URL + path and return its RequestHandle.
+
+        on_success(reply) or on_error(RequestError) is called on the UI thread unless the request is
+        cancelled first. replace=True cancels the pending requests that have the same tag. Higher priority
+        requests leave the queue first; cache is an optional DiskCache to revalidate against.
+        """
+        if replace and tag is not None:
+            self.cancel(tag)
+
+        handle = RequestHandle(tag)
+        url = path if path.startswith("http") else SERVER_URL + path
+        task = _HttpTask(handle, method, url, parse, timeout, kwargs, self._signals, cache)
+        self._active[handle] = (task, on_success, on_error)
+        self.pool.start(task, priority)
+        return handle
+
+    def get(self, path, on_success, on_error=None, **kwargs):
+        return self.request("GET", path, on_success, on_error, **kwargs)
+
+    def post(self, path, on_success, on_error=None, **kwargs):
+        return self.request("POST", path, on_success, on_error, **kwargs)
+
+    def is_pending(self, tag):
+        return any(handle.tag == tag for handle in self._active)
+
+    def cancel(self, tag):
+        """Cancel every pending request with this tag"""
+        for handle in [handle for handle in self._active if handle.tag == tag]:
+            self._cancel_handle(handle)
+
+    def cancel_all(self):
+        for handle in list(self._active):
+            self._cancel_handle(handle)
+
+    def shutdown(self):
+        """Cancel everything; running requests end at their next chunk or timeout"""
+        self.cancel_all()
+        self.pool.clear()
+
+    def _cancel_handle(self, handle):
+        handle.cancel()
+        task = self._active.pop(handle)[0]
+        # Not started yet: drop it from the queue; otherwise it stops at its next chunk
+        self.pool.tryTake(task)
+
+    def _on_finished(self, handle, reply):
+        self._deliver(handle, reply, 1)
+
+    def _on_failed(self, handle, error):
+        self._deliver(handle, error, 2)
+
+    def _deliver(self, handle, result, callback_index):
+        # A request cancelled after its worker already emitted is dropped here
+        entry = self._active.pop(handle, None)
+        if entry is None or handle.cancelled:
+            return
+        callback = entry[callback_index]
+        if callback is not None:
+            callback(result)
@@ -0,0 +1,141 @@
+"""
+Client-side caches for the MCAD GUI.
+
+LRUCache keeps decoded QPixmap tiles (and parsed JSON metadata) in memory, bounded
+by an estimate of their size. DiskCache keeps the raw response bytes of the server's PNG and JSON
+endpoints on disk together with their ETag; NetworkClient sends that ETag as If-None-Match and reuses
+the stored bytes when the server answers 304, so reopening the GUI does not download images again.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "mcad_gui"
+
+
+def pixmap_bytes(pixmap):
+    """Approximate memory held by a QPixmap"""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class LRUCache:
+    """key -> value, least recently used evicted first once max_entries or max_bytes is exceeded.
+
+    Only used from the UI thread (QPixmap must stay there), so there is no locking.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        # Always keep the newest entry, even if it alone is over budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+
+class CachedResponse:
+    def __init__(self, etag, body):
+        self.etag = etag
+        self.body = body
+
+
+class DiskCache:
+    """URL -> (ETag, body) files under cache_dir; safe to use from the network worker threads.
+
+    Each entry is <sha1 of url>.etag and <sha1 of url>.bin, both written atomically. Once the cache grows
+    past max_bytes the least recently used entries are removed until it is back under 90% of it.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                          if entry.name.endswith(".bin"))
+
+    def _paths(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{name}.etag", self.cache_dir / f"{name}.bin"
+
+    def get(self, url):
+        """The stored response for url, or None"""
+        etag_path, body_path = self._paths(url)
+        try:
+            etag = etag_path.read_text()
+            body = body_path.read_bytes()
+        except OSError:
+            return None
+        try:
+            # Mark it recently used for pruning
+            os.utime(body_path)
+        except OSError:
+            pass
+        return CachedResponse(etag, body)
+
+    def put(self, url, etag, body):
+        etag_path, body_path = self._paths(url)
+        try:
+            old_size = body_path.stat().st_size
+        except OSError:
+            old_size = 0
+        try:
+            # Body before ETag: a stale ETag next to a new body only costs one full download
+            self._write(body_path, body)
+            self._write(etag_path, etag.encode("utf-8"))
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += len(body) - old_size
+            if self._bytes > self.max_bytes:
+                self._prune()
+
+    def _write(self, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+
+    def _prune(self):
+        bodies = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                        for entry in os.scandir(self.cache_dir) if entry.name.endswith(".bin"))
+        self._bytes = sum(size for _, size, _ in bodies)
+        for _, size, path in bodies:
+            if self._bytes <= self.max_bytes * 0.9:
+                break
+            for stale in (path, path[:-len(".bin")] + ".etag"):
+                try:
+                    os.unlink(stale)
+                except OSError:
+                    pass
+            self._bytes -= size
+
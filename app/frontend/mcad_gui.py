@@ -1,14 +1,19 @@
 import sys
 import json
-import requests
-import base64
 from PyQt6.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, QVBoxLayout,
                              QComboBox, QHBoxLayout, QLineEdit, QMessageBox,
-                             QTextEdit, QTabWidget, QScrollArea, QSplitter, QSizePolicy)
+                             QTextEdit, QTabWidget, QScrollArea, QSplitter, QSizePolicy,
+                             QCheckBox, QDoubleSpinBox)
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt
 
+from crater_overlay import CraterOverlay
+from gui_network import NetworkClient
+from image_cache import DiskCache, LRUCache
+from tiled_viewer import TiledImageView
+
 API_URL = "http://127.0.0.1:8000/compute_crater_size/"  # FastAPI endpoint
+MANIFEST_URL = "http://127.0.0.1:8000/manifest"  # Every folder/image in one response
 
 
 class MCAD_GUI(QWidget):
@@ -17,6 +22,11 @@ class MCAD_GUI(QWidget):
         self.setWindowTitle("MCAD (Lunar Crater Analysis Tool)")
         self.setGeometry(100, 100, 1000, 800)  # Increased width for the new layout
 
+        # All server calls run in the background; callbacks come back on the UI thread.
+        # Raw PNG/JSON/tile responses are kept on disk and revalidated with their ETag
+        self.network = NetworkClient(self)
+        self.disk_cache = DiskCache()
+
         # Main horizontal layout to split left and right sides
         main_layout = QHBoxLayout(self)
 
@@ -55,14 +65,13 @@ class MCAD_GUI(QWidget):
         self.image_container.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         image_container_layout = QVBoxLayout(self.image_container)
 
-        # Image display label
-        self.image_label = QLabel()
-        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setStyleSheet("font-family: Chalkboard; background-color: #2E3192; font-size: 20px; border: 5px solid #2E3192;")
-        self.image_label.setText("No image loaded")
-        self.image_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        # Zoomable image display: wheel to zoom, drag to pan, double-click to fit
+        self.image_view = TiledImageView(self.network, self.disk_cache)
+        self.image_view.setStyleSheet("font-family: Chalkboard; background-color: #2E3192; font-size: 20px; border: 5px solid #2E3192;")
+        self.image_view.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.image_view.failed.connect(self.on_image_failed)
 
-        image_container_layout.addWidget(self.image_label)
+        image_container_layout.addWidget(self.image_view)
         left_layout.addWidget(self.image_container, 1)  # Give it more stretch factor
 
         # Results section - now on the left under the image
@@ -114,7 +123,17 @@ class MCAD_GUI(QWidget):
 
         # Initialize current JSON data
         self.current_json_data = None
-        self.current_image_data = None
+
+        # (folder, file name) -> parsed JSON for recently viewed and prefetched images
+        # (their tiles are cached by image_view)
+        self.json_cache = LRUCache(max_entries=2048)
+        self.crater_cache = LRUCache(max_entries=64)  # (folder, file name) -> /craters/image columns
+        self.current_key = None
+        self._prefetching = set()  # Keys whose JSON prefetch is in flight
+
+        # Folder -> PNG file names, from the server's manifest (empty until it loads)
+        self.manifest_files = {}
+        self.load_manifest()
 
     def setup_image_controls_tab(self):
         # Dropdown for selecting folder
@@ -143,9 +162,36 @@ class MCAD_GUI(QWidget):
         png_hbox.addWidget(self.png_combo)
         png_hbox.addWidget(self.load_img_btn)
 
+        # Crater overlay: the image's detections drawn over it, filtered interactively
+        self.show_craters_check = QCheckBox("Show detected craters")
+        self.show_craters_check.setChecked(True)
+        self.show_craters_check.toggled.connect(self.update_crater_overlay)
+
+        self.min_confidence_spin = QDoubleSpinBox()
+        self.min_confidence_spin.setRange(0.0, 1.0)
+        self.min_confidence_spin.setSingleStep(0.05)
+        self.min_confidence_spin.valueChanged.connect(self.update_crater_overlay)
+
+        self.min_diameter_spin = QDoubleSpinBox()
+        self.min_diameter_spin.setRange(0.0, 1000000.0)
+        self.min_diameter_spin.setSingleStep(10.0)
+        self.min_diameter_spin.setSuffix(" m")
+        self.min_diameter_spin.valueChanged.connect(self.update_crater_overlay)
+
+        self.crater_count_label = QLabel("")
+
+        crater_filter_hbox = QHBoxLayout()
+        crater_filter_hbox.addWidget(QLabel("Min Confidence:"))
+        crater_filter_hbox.addWidget(self.min_confidence_spin)
+        crater_filter_hbox.addWidget(QLabel("Min Diameter:"))
+        crater_filter_hbox.addWidget(self.min_diameter_spin)
+
         vbox = QVBoxLayout()
         vbox.addLayout(folder_hbox)
         vbox.addLayout(png_hbox)
+        vbox.addWidget(self.show_craters_check)
+        vbox.addLayout(crater_filter_hbox)
+        vbox.addWidget(self.crater_count_label)
         vbox.addStretch()
 
         self.image_controls_tab.setLayout(vbox)
@@ -197,30 +243,56 @@ class MCAD_GUI(QWidget):
 
         self.analysis_tab.setLayout(vbox)
 
+    def load_manifest(self):
+        """Fetch the whole catalogue once so switching folders needs no server round trip; an unchanged
+        catalogue costs a 304 and comes from the disk cache"""
+        self.network.get(MANIFEST_URL, self.on_manifest_loaded, self.on_manifest_failed, tag="manifest", timeout=30,
+                         cache=self.disk_cache)
+
+    def on_manifest_failed(self, error):
+        print(f"Manifest not available, listing folders on demand: {error}")
+
+    def on_manifest_loaded(self, reply):
+        manifest = reply.data or {}
+        columns = manifest.get("columns", {})
+        manifest_files = {folder: [] for folder in manifest.get("folders", [])}
+        for folder_num, file_name in zip(columns.get("folder_num", []), columns.get("file_name", [])):
+            manifest_files.setdefault(str(folder_num).zfill(3), []).append(file_name)
+        if not manifest_files:
+            return
+
+        self.manifest_files = manifest_files
+        self.folder_combo.clear()
+        self.folder_combo.addItems(sorted(manifest_files))
+        # Listing a folder is now instant, so follow the folder selection directly
+        self.folder_combo.currentTextChanged.connect(self.load_png_files)
+        self.load_png_files()
+
+    def show_request_error(self, error, what):
+        """Report a failed background request the way the synchronous code used to"""
+        if error.kind == "connection":
+            QMessageBox.critical(self, "Connection Error", error.message)
+        elif error.kind == "timeout":
+            QMessageBox.critical(self, "Timeout Error", error.message)
+        else:
+            QMessageBox.critical(self, "Error", f"Error fetching {what}: {error.message}")
+
     def load_png_files(self):
         folder_number = self.folder_combo.currentText()
-        url = f"http://127.0.0.1:8000/list_png_files/{folder_number}"
+        if folder_number in self.manifest_files:
+            self.png_combo.clear()
+            self.png_combo.addItems(self.manifest_files[folder_number])
+            return
 
-        try:
-            response = requests.get(url, timeout=10)
-
-            # Check if response is successful and contains valid JSON
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    png_files = data.get("png_files", [])
-                    self.png_combo.clear()
-                    self.png_combo.addItems(png_files)
-                except json.JSONDecodeError:
-                    QMessageBox.critical(self, "Error", "Invalid JSON response from server")
-            else:
-                QMessageBox.critical(self, "Error", f"Server error: {response.status_code}")
-        except requests.exceptions.ConnectionError:
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Is the API running?")
-        except requests.exceptions.Timeout:
-            QMessageBox.critical(self, "Timeout Error", "Server request timed out")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error fetching PNG files: {str(e)}")
+        # Only the listing for the most recently chosen folder matters
+        self.network.get(f"/list_png_files/{folder_number}", self.on_png_files_loaded,
+                         lambda error: self.show_request_error(error, "PNG files"),
+                         tag="png_files", replace=True, timeout=10)
+
+    def on_png_files_loaded(self, reply):
+        png_files = (reply.data or {}).get("png_files", [])
+        self.png_combo.clear()
+        self.png_combo.addItems(png_files)
 
     def load_image_and_data(self):
         folder_number = self.folder_combo.currentText()
@@ -229,153 +301,173 @@ class MCAD_GUI(QWidget):
             QMessageBox.warning(self, "Warning", "No file selected")
             return
 
-        # Load the image
+        # The image and its JSON are fetched in parallel; either request still running for the
+        # previously selected image is cancelled
+        self.current_key = (folder_number, file_name)
         self.load_image(folder_number, file_name)
-
-        # Load the corresponding JSON data
         self.load_json_data(folder_number, file_name)
+        self.load_craters(folder_number, file_name)
+        self.prefetch_neighbours()
 
     def load_image(self, folder_number, file_name):
-        url = f"http://127.0.0.1:8000/get_png/{folder_number}/{file_name}"
+        # The viewer fetches the pyramid info and then only the tiles it needs for the current zoom
+        self.image_view.set_image(folder_number, file_name)
+
+    def on_image_failed(self, error):
+        if error.kind == "connection":
+            self.image_view.set_message("Connection Error")
+        elif error.kind == "timeout":
+            self.image_view.set_message("Request Timeout")
+        elif error.kind == "http":
+            self.image_view.set_message(f"Error: {error.status_code}")
+        else:
+            self.image_view.set_message("Error loading image")
+        self.show_request_error(error, "image")
+
+    def load_craters(self, folder_number, file_name):
+        """Fetch every detection of the image in one columnar request and draw them as one overlay item"""
+        key = (folder_number, file_name)
+        self.network.cancel("craters")
+        self.image_view.set_overlay(None)
+        self.crater_count_label.setText("")
+        cached = self.crater_cache.get(key)
+        if cached is not None:
+            self.show_craters(cached)
+            return
 
         try:
-            # Display loading message
-            self.image_label.setText("Loading image...")
-            QApplication.processEvents()  # Update UI
-
-            response = requests.get(url, timeout=15)
-
-            if response.status_code == 200:
-                # Check for raw image data first (binary response)
-                content_type = response.headers.get('Content-Type', '')
-
-                if 'image' in content_type:
-                    # Direct binary image data
-                    image_data = response.content
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(image_data)
-                    self.current_image_data = image_data
-                else:
-                    # Try to parse as JSON with base64 image
-                    try:
-                        data = response.json()
-                        image_base64 = data.get("image_base64", "")
-                        image_data = base64.b64decode(image_base64)
-                        pixmap = QPixmap()
-                        pixmap.loadFromData(image_data)
-                        self.current_image_data = image_data
-                    except json.JSONDecodeError:
-                        # If not JSON, try to use content directly as image
-                        image_data = response.content
-                        pixmap = QPixmap()
-                        if pixmap.loadFromData(image_data):
-                            self.current_image_data = image_data
-                        else:
-                            raise ValueError("Could not parse image data")
-
-                # Calculate the available space in the image container
-                container_width = self.image_container.width()
-                container_height = self.image_container.height()
-
-                # Scale the image to fit the container while maintaining aspect ratio
-                scaled_pixmap = pixmap.scaled(
-                    container_width,
-                    container_height,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-
-                # Set the pixmap and let it adjust dynamically when window is resized
-                self.image_label.setPixmap(scaled_pixmap)
-
-                # Store original pixmap for rescaling on resize
-                self.original_pixmap = pixmap
-
-                # Connect resize event if not already connected
-                self.image_container.resizeEvent = self.image_container_resized
-            else:
-                self.image_label.setText(f"Error: {response.status_code}")
-                QMessageBox.critical(self, "Error", f"Server returned status code: {response.status_code}")
-
-        except requests.exceptions.ConnectionError:
-            self.image_label.setText("Connection Error")
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Is the API running?")
-        except requests.exceptions.Timeout:
-            self.image_label.setText("Request Timeout")
-            QMessageBox.critical(self, "Timeout Error", "Server request timed out")
-        except Exception as e:
-            self.image_label.setText("Error loading image")
-            QMessageBox.critical(self, "Error", f"Error fetching image: {str(e)}")
-
-    def image_container_resized(self, event):
-        """Handle resizing of the image container to scale the image properly"""
-        if hasattr(self, 'original_pixmap') and not self.original_pixmap.isNull():
-            # Get the container's new size
-            container_width = self.image_container.width()
-            container_height = self.image_container.height()
-
-            # Scale the image to fit the container
-            scaled_pixmap = self.original_pixmap.scaled(
-                container_width - 20,  # Allow for margins
-                container_height - 20,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-
-            # Update the image label
-            self.image_label.setPixmap(scaled_pixmap)
-
-        # Make sure to call the parent class's resizeEvent
-        super(QWidget, self.image_container).resizeEvent(event)
+            # Folders are "000"-"275" and images "image_<n>.png"
+            folder_num = int(folder_number.split(" ")[-1])
+            image_num = int(file_name.rsplit(".", 1)[0].rsplit("_", 1)[-1])
+        except ValueError:
+            return
+        self.network.get(f"/craters/image/{folder_num}/{image_num}", lambda reply: self.on_craters_loaded(key, reply),
+                         self.on_craters_failed, tag="craters", timeout=30)
+
+    def on_craters_loaded(self, key, reply):
+        columns = (reply.data or {}).get("columns", {})
+        self.crater_cache.put(key, columns, 0)
+        if key == self.current_key:
+            self.show_craters(columns)
+
+    def on_craters_failed(self, error):
+        # The image is still usable without its detections, so no dialog
+        self.crater_count_label.setText(f"Craters unavailable: {error.message}")
+
+    def show_craters(self, columns):
+        # A new item per image: the viewer's scene owns it and deletes it with the image
+        self.image_view.set_overlay(CraterOverlay(columns))
+        self.update_crater_overlay()
+
+    def update_crater_overlay(self):
+        """Apply the visibility checkbox and the confidence/diameter filters to the current overlay"""
+        overlay = self.image_view.overlay
+        if overlay is None:
+            return
+        overlay.setVisible(self.show_craters_check.isChecked())
+        overlay.set_filters(self.min_confidence_spin.value(), self.min_diameter_spin.value())
+        self.crater_count_label.setText(f"{overlay.shown_count()} of {overlay.total_count()} craters shown")
+
+    def prefetch_neighbours(self):
+        """Fetch the images either side of the selected one in the background, so flipping through a
+        folder is served from the memory cache"""
+        folder_number = self.folder_combo.currentText()
+        index = self.png_combo.currentIndex()
+        wanted = {(folder_number, self.png_combo.itemText(i))
+                  for i in (index + 1, index - 1) if 0 <= i < self.png_combo.count()}
+
+        # Stop prefetching images the user has moved away from
+        self.image_view.cancel_requests(keep=wanted)
+        for key in list(self._prefetching):
+            if key not in wanted and key != self.current_key:
+                self.network.cancel(("prefetch", key))
+                self._prefetching.discard(key)
+
+        for key in wanted:
+            self.image_view.prefetch(*key)
+            if key not in self.json_cache and key not in self._prefetching:
+                self._prefetch_json(key)
+
+    def _prefetch_json(self, key):
+        folder_number, file_name = key
+
+        def loaded(reply):
+            self._prefetching.discard(key)
+            self.on_json_loaded(key, reply)
+
+        def failed(error):
+            self._prefetching.discard(key)
+            # The user is waiting on this one: fetch it again normally so errors are reported as usual
+            if key == self.current_key:
+                self.load_json_data(*key)
+
+        self._prefetching.add(key)
+        # Lower priority than the requests for the image on screen
+        self.network.get(f"/get_json/{folder_number}/{file_name.replace('.png', '.json')}", loaded, failed,
+                         tag=("prefetch", key), timeout=15, priority=-1, cache=self.disk_cache)
 
     def load_json_data(self, folder_number, file_name):
+        key = (folder_number, file_name)
+        self.network.cancel("json")
+        cached = self.json_cache.get(key)
+        if cached is not None:
+            self.show_json(cached)
+            return
+
         # Convert PNG filename to JSON filename
         json_file_name = file_name.replace(".png", ".json")
 
+        # Display loading message
+        self.json_display.setText("Loading JSON data...")
+        self.current_json_data = None
+        if key in self._prefetching:
+            # The prefetch waits behind the visible image's tiles; ask again at normal priority
+            self.network.cancel(("prefetch", key))
+            self._prefetching.discard(key)
+
         # Call API to get JSON data
-        url = f"http://127.0.0.1:8000/get_json/{folder_number}/{json_file_name}"
+        self.network.get(f"/get_json/{folder_number}/{json_file_name}", lambda reply: self.on_json_loaded(key, reply),
+                         self.on_json_failed, tag="json", timeout=10, cache=self.disk_cache)
 
+    def on_json_loaded(self, key, reply):
         try:
-            # Display loading message
-            self.json_display.setText("Loading JSON data...")
-            QApplication.processEvents()  # Update UI
-
-            response = requests.get(url, timeout=10)
-
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    json_data = data.get("json_data", {})
+            json_data = (reply.data or {}).get("json_data", {})
+
+            # If json_data is a string, try to parse it
+            if isinstance(json_data, str):
+                json_data = json.loads(json_data)
+        except json.JSONDecodeError as e:
+            if key == self.current_key:
+                self.json_display.setText(f"Error parsing JSON: {str(e)}")
+                self.current_json_data = None
+            return
 
-                    # If json_data is a string, try to parse it
-                    if isinstance(json_data, str):
-                        json_data = json.loads(json_data)
+        self.json_cache.put(key, json_data, 0)
+        if key == self.current_key:
+            self.show_json(json_data)
 
-                    self.current_json_data = json_data
+    def show_json(self, json_data):
+        self.current_json_data = json_data
 
-                    # Format JSON for display
-                    formatted_json = json.dumps(json_data, indent=2)
-                    self.json_display.setText(formatted_json)
+        # Format JSON for display
+        formatted_json = json.dumps(json_data, indent=2)
+        self.json_display.setText(formatted_json)
 
-                    # Switch to the JSON data tab
-                    self.tab_widget.setCurrentIndex(1)
-                except json.JSONDecodeError as e:
-                    self.json_display.setText(f"Error parsing JSON: {str(e)}")
-                    self.current_json_data = None
-            else:
-                self.json_display.setText(f"Server error: {response.status_code}")
-                self.current_json_data = None
+        # Switch to the JSON data tab
+        self.tab_widget.setCurrentIndex(1)
 
-        except requests.exceptions.ConnectionError:
+    def on_json_failed(self, error):
+        self.current_json_data = None
+        if error.kind == "connection":
             self.json_display.setText("Connection Error: Could not connect to server")
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Is the API running?")
-        except requests.exceptions.Timeout:
+        elif error.kind == "timeout":
             self.json_display.setText("Request Timeout")
-            QMessageBox.critical(self, "Timeout Error", "Server request timed out")
-        except Exception as e:
-            self.json_display.setText(f"Error: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Error fetching JSON data: {str(e)}")
-            self.current_json_data = None
+        elif error.kind == "http":
+            self.json_display.setText(f"Server error: {error.status_code}")
+            return
+        else:
+            self.json_display.setText(f"Error: {error.message}")
+        self.show_request_error(error, "JSON data")
 
     def auto_fill_from_json(self):
         if not self.current_json_data:
@@ -437,65 +529,69 @@ class MCAD_GUI(QWidget):
 
             data = {"cam_pos": cam_pos, "pixel_diameter": pixel_diameter}
 
-            # Show processing message
+            # Show processing message; the UI stays responsive while the server computes
             self.result_label.setText("Computing crater size...")
-            QApplication.processEvents()  # Update UI
-
-            response = requests.post(API_URL, json=data, timeout=15)
-
-            if response.status_code == 200:
-                try:
-                    result = response.json()
-
-                    altitude_m = result.get('camera_altitude_m', 0)
-                    altitude_miles = altitude_m * 0.000621371
-
-                    image_width_m = result.get('image_width_m', 0)
-                    image_width_miles = image_width_m * 0.000621371
-
-                    # Calculate image height (assuming it's proportional to the width)
-                    if self.current_json_data:
-                        try:
-                            fov_x = float(self.current_json_data.get("FOV X (rad)", 0.3490658503988659))
-                            fov_y = float(self.current_json_data.get("FOV Y (rad)", 0.27580511636453603))
-                            image_height_m = (image_width_m / fov_x) * fov_y
-                            image_height_miles = image_height_m * 0.000621371
-                        except (ValueError, TypeError, ZeroDivisionError):
-                            image_height_m = 0
-                            image_height_miles = 0
-                    else:
-                        image_height_m = 0
-                        image_height_miles = 0
-
-                    crater_diameter_m = result.get('crater_diameter_m', 0)
-                    crater_diameter_miles = crater_diameter_m * 0.000621371
-
-                    self.result_label.setText(
-                        f"Camera Altitude: {altitude_m:.2f} m ({altitude_miles:.4f} mi)\n\n"
-                        f"Image Width: {image_width_m:.2f} m ({image_width_miles:.4f} mi)\n"
-                        f"Image Height: {image_height_m:.2f} m ({image_height_miles:.4f} mi)\n\n"
-                        f"Crater Diameter: {crater_diameter_m:.2f} m ({crater_diameter_miles:.4f} mi)"
-                    )
-                except json.JSONDecodeError:
-                    self.result_label.setText("Error: Could not parse server response")
-                    QMessageBox.critical(self, "Error", "Invalid response from server")
-            else:
-                self.result_label.setText(f"Error: Server returned status {response.status_code}")
-                QMessageBox.critical(self, "Error", f"Failed to compute crater size.\nServer Response: {response.text}")
+            self.network.post(API_URL, self.on_crater_size_computed, self.on_crater_size_failed,
+                              tag="compute", replace=True, timeout=15, json=data)
 
         except ValueError as ve:
             self.result_label.setText(f"Input Error: {str(ve)}")
             QMessageBox.warning(self, "Input Error", str(ve))
-        except requests.exceptions.ConnectionError:
+
+    def on_crater_size_computed(self, reply):
+        result = reply.data or {}
+
+        altitude_m = result.get('camera_altitude_m', 0)
+        altitude_miles = altitude_m * 0.000621371
+
+        image_width_m = result.get('image_width_m', 0)
+        image_width_miles = image_width_m * 0.000621371
+
+        # Calculate image height (assuming it's proportional to the width)
+        if self.current_json_data:
+            try:
+                fov_x = float(self.current_json_data.get("FOV X (rad)", 0.3490658503988659))
+                fov_y = float(self.current_json_data.get("FOV Y (rad)", 0.27580511636453603))
+                image_height_m = (image_width_m / fov_x) * fov_y
+                image_height_miles = image_height_m * 0.000621371
+            except (ValueError, TypeError, ZeroDivisionError):
+                image_height_m = 0
+                image_height_miles = 0
+        else:
+            image_height_m = 0
+            image_height_miles = 0
+
+        crater_diameter_m = result.get('crater_diameter_m', 0)
+        crater_diameter_miles = crater_diameter_m * 0.000621371
+
+        self.result_label.setText(
+            f"Camera Altitude: {altitude_m:.2f} m ({altitude_miles:.4f} mi)\n\n"
+            f"Image Width: {image_width_m:.2f} m ({image_width_miles:.4f} mi)\n"
+            f"Image Height: {image_height_m:.2f} m ({image_height_miles:.4f} mi)\n\n"
+            f"Crater Diameter: {crater_diameter_m:.2f} m ({crater_diameter_miles:.4f} mi)"
+        )
+
+    def on_crater_size_failed(self, error):
+        if error.kind == "connection":
             self.result_label.setText("Connection Error")
-            QMessageBox.critical(self, "Connection Error", "Could not connect to the server. Is the API running?")
-        except requests.exceptions.Timeout:
+            QMessageBox.critical(self, "Connection Error", error.message)
+        elif error.kind == "timeout":
             self.result_label.setText("Request Timeout")
-            QMessageBox.critical(self, "Timeout Error", "Server request timed out")
-        except Exception as e:
-            self.result_label.setText(f"Error: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Unexpected error: {str(e)}")
-
+            QMessageBox.critical(self, "Timeout Error", error.message)
+        elif error.kind == "http":
+            self.result_label.setText(f"Error: Server returned status {error.status_code}")
+            QMessageBox.critical(self, "Error", f"Failed to compute crater size.\nServer Response: {error.text}")
+        elif error.kind == "parse":
+            self.result_label.setText("Error: Could not parse server response")
+            QMessageBox.critical(self, "Error", "Invalid response from server")
+        else:
+            self.result_label.setText(f"Error: {error.message}")
+            QMessageBox.critical(self, "Error", f"Unexpected error: {error.message}")
+
+    def closeEvent(self, event):
+        # Drop pending requests so no callback runs against a closed window
+        self.network.shutdown()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,318 @@
+"""
+Zoomable, tiled image viewer for the MCAD GUI.
+
+TiledImageView shows one image from the backend's tile pyramid (/tiles/{folder}/{image}/...). Scene
+coordinates are full-resolution pixels. Zoom level 0 (the whole image in one tile) is stretched underneath
+as a placeholder, and on top only the tiles of the level matching the current zoom that intersect the
+viewport are requested, nearest the centre first. Tiles that scroll out of view are removed from the scene
+and their requests cancelled, and decoded tiles live in a byte-bounded LRU, so memory stays bounded however
+far the user zooms into a 2592x2048 image.
+
+While the user zooms or resizes the window, tiles are drawn with a fast transform; smooth filtering (and, for a
+fitted image, a final refit) comes back once that pauses.
+"""
+import math
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtWidgets import QGraphicsPixmapItem, QGraphicsScene, QGraphicsView
+
+from image_cache import LRUCache, pixmap_bytes
+
+UPDATE_DELAY_MS = 40  # Tiles are requested once scrolling/zooming pauses this long
+SETTLE_MS = 150  # Smooth filtering is switched back on after this long without zooming or resizing
+ZOOM_STEP = 1.25  # Per wheel notch
+MAX_SCALE = 4.0  # Screen pixels per image pixel at most
+TILE_CACHE_BYTES = 128 * 1024 * 1024
+BASE_TILE = (0, 0, 0)
+BASE_Z_VALUE = 0  # Finer levels are stacked above the placeholder
+
+
+class TiledImageView(QGraphicsView):
+    # RequestError when an image's pyramid cannot be loaded
+    failed = pyqtSignal(object)
+
+    def __init__(self, network, disk_cache=None, parent=None):
+        super().__init__(parent)
+        self.network = network
+        self.disk_cache = disk_cache
+        self.setScene(QGraphicsScene(self))
+        self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+        self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorViewCenter)
+
+        self.infos = LRUCache(max_entries=512)  # (folder, file) -> pyramid info
+        self.tiles = LRUCache(max_entries=4096, max_bytes=TILE_CACHE_BYTES)  # (folder, file, z, x, y) -> QPixmap
+        self.info_requests = {}  # (folder, file) -> tag of its info request in flight
+        self.tile_requests = {}  # (folder, file, z, x, y) -> tag of its request in flight
+
+        self.key = None
+        self.info = None
+        self.tile_items = {}  # (z, x, y) -> QGraphicsPixmapItem in the scene
+        self.overlay = None  # Item drawn above the tiles (crater detections)
+        self.fitted = True  # Follow the viewport size until the user zooms
+        self.smooth = True
+        self.message = "No image loaded"
+
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(UPDATE_DELAY_MS)
+        self.update_timer.timeout.connect(self.update_tiles)
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(SETTLE_MS)
+        self.settle_timer.timeout.connect(self._settle)
+
+    # Loading
+
+    def set_image(self, folder_number, file_name):
+        """Show an image; its pyramid info comes from the cache, a prefetch in flight, or a new request"""
+        key = (folder_number, file_name)
+        if key == self.key and self.info is not None:
+            return
+        self.clear_image()
+        self.key = key
+        info = self.infos.get(key)
+        if info is not None:
+            self._show_info(info)
+            return
+        self.set_message("Loading image...")
+        if key not in self.info_requests:
+            self._request_info(key, priority=0)
+
+    def prefetch(self, folder_number, file_name):
+        """Fetch an image's info and the tiles that fill the current viewport, at low priority"""
+        key = (folder_number, file_name)
+        info = self.infos.get(key)
+        if info is not None:
+            self._prefetch_tiles(key, info)
+        elif key not in self.info_requests:
+            self._request_info(key, priority=-1)
+
+    def cancel_requests(self, keep=()):
+        """Cancel the info and tile requests of every image except the shown one and those in keep"""
+        keep = set(keep) | {self.key}
+        for key in [key for key in self.info_requests if key not in keep]:
+            self.network.cancel(self.info_requests.pop(key))
+        for tile_key in [tile_key for tile_key in self.tile_requests if tile_key[:2] not in keep]:
+            self.network.cancel(self.tile_requests.pop(tile_key))
+
+    def clear_image(self, message=None):
+        for tile_key in [tile_key for tile_key in self.tile_requests if tile_key[:2] == self.key]:
+            # Visible tiles of the old image are not worth finishing, but its base tile is (cheap, and
+            # it makes coming back instant)
+            if tile_key[2:] != BASE_TILE:
+                self.network.cancel(self.tile_requests.pop(tile_key))
+        self.scene().clear()
+        self.tile_items = {}
+        self.overlay = None
+        self.key = None
+        self.info = None
+        self.set_message(message)
+
+    def set_overlay(self, item):
+        """Replace the item drawn above the image (None to remove it); it uses full-resolution coordinates"""
+        if self.overlay is not None:
+            self.scene().removeItem(self.overlay)
+        self.overlay = item
+        if item is not None:
+            self.scene().addItem(item)
+
+    def set_message(self, message):
+        """Text drawn over the view (loading and error states); None to hide it"""
+        self.message = message
+        self.viewport().update()
+
+    def _request_info(self, key, priority):
+        folder_number, file_name = key
+        tag = ("tile_info",) + key
+        self.info_requests[key] = tag
+        # The first request for an image builds its pyramid on the server, which takes a moment
+        self.network.get(f"/tiles/{folder_number}/{file_name}/info", lambda reply: self._on_info(key, reply),
+                         lambda error: self._on_info_failed(key, error), tag=tag, timeout=60, priority=priority)
+
+    def _on_info(self, key, reply):
+        self.info_requests.pop(key, None)
+        self.infos.put(key, reply.data, 0)
+        if key == self.key:
+            self._show_info(reply.data)
+        else:
+            self._prefetch_tiles(key, reply.data)
+
+    def _on_info_failed(self, key, error):
+        self.info_requests.pop(key, None)
+        if key == self.key:
+            self.failed.emit(error)
+
+    def _show_info(self, info):
+        self.info = info
+        self.set_message(None)
+        self.scene().setSceneRect(0, 0, info["width"], info["height"])
+        self.fit()
+        self.update_tiles()
+
+    def _prefetch_tiles(self, key, info):
+        z = self._level_for_scale(info, self._fit_scale(info))
+        level = info["levels"][z]
+        for tile in [BASE_TILE] + [(z, x, y) for x in range(level["columns"]) for y in range(level["rows"])]:
+            if key + tile not in self.tiles and key + tile not in self.tile_requests:
+                self._request_tile(key, tile, priority=-1)
+
+    def _request_tile(self, key, tile, priority):
+        folder_number, file_name = key
+        z, x, y = tile
+        tag = ("tile",) + key + tile
+        self.tile_requests[key + tile] = tag
+        self.network.get(f"/tiles/{folder_number}/{file_name}/{z}/{x}/{y}",
+                         lambda reply: self._on_tile(key, tile, reply),
+                         lambda error: self.tile_requests.pop(key + tile, None),
+                         tag=tag, parse="image", timeout=60, priority=priority, cache=self.disk_cache)
+
+    def _on_tile(self, key, tile, reply):
+        self.tile_requests.pop(key + tile, None)
+        pixmap = QPixmap.fromImage(reply.data[0])
+        self.tiles.put(key + tile, pixmap, pixmap_bytes(pixmap))
+        if key == self.key and self.info is not None and tile not in self.tile_items:
+            self._add_tile(tile, pixmap)
+
+    # Levels and visible tiles
+
+    def _fit_scale(self, info):
+        viewport = self.viewport().rect()
+        return min(viewport.width() / info["width"], viewport.height() / info["height"])
+
+    @staticmethod
+    def _level_for_scale(info, scale):
+        """Coarsest level that still has at least one level pixel per screen pixel"""
+        max_zoom = info["max_zoom"]
+        if scale <= 0:
+            return 0
+        return min(max_zoom, max(0, max_zoom + math.ceil(math.log2(scale) - 1e-9)))
+
+    def _tile_span(self, z):
+        """Scene pixels covered by one tile (and by one level pixel) at level z"""
+        factor = 2 ** (self.info["max_zoom"] - z)
+        return self.info["tile_size"] * factor, factor
+
+    def update_tiles(self):
+        """Show the tiles that cover the viewport at the current zoom; drop and cancel the rest"""
+        if self.info is None:
+            return
+        z = self._level_for_scale(self.info, self.transform().m11())
+        visible = self.mapToScene(self.viewport().rect()).boundingRect().intersected(self.sceneRect())
+
+        wanted = {BASE_TILE}
+        if z > 0 and not visible.isEmpty():
+            span, _ = self._tile_span(z)
+            level = self.info["levels"][z]
+            x_range = range(max(0, int(visible.left() // span)), min(level["columns"], int(visible.right() // span) + 1))
+            y_range = range(max(0, int(visible.top() // span)), min(level["rows"], int(visible.bottom() // span) + 1))
+            wanted.update((z, x, y) for x in x_range for y in y_range)
+
+        for tile in [tile for tile in self.tile_items if tile not in wanted]:
+            self.scene().removeItem(self.tile_items.pop(tile))
+        for tile_key in [tile_key for tile_key in self.tile_requests
+                         if tile_key[:2] == self.key and tile_key[2:] not in wanted]:
+            self.network.cancel(self.tile_requests.pop(tile_key))
+
+        def distance(tile):
+            span, _ = self._tile_span(tile[0])
+            return (abs((tile[1] + 0.5) * span - visible.center().x()) +
+                    abs((tile[2] + 0.5) * span - visible.center().y()))
+
+        # The placeholder first, then outwards from the centre of the view
+        for tile in sorted(wanted - set(self.tile_items), key=lambda tile: (tile != BASE_TILE, distance(tile))):
+            pixmap = self.tiles.get(self.key + tile)
+            if pixmap is not None:
+                self._add_tile(tile, pixmap)
+            elif self.key + tile not in self.tile_requests:
+                self._request_tile(self.key, tile, priority=0)
+
+    def _add_tile(self, tile, pixmap):
+        z, x, y = tile
+        span, factor = self._tile_span(z)
+        item = QGraphicsPixmapItem(pixmap)
+        item.setPos(x * span, y * span)
+        item.setScale(factor)
+        item.setZValue(BASE_Z_VALUE + z)
+        item.setTransformationMode(self._transformation_mode())
+        self.scene().addItem(item)
+        self.tile_items[tile] = item
+
+    # Zoom and pan
+
+    def fit(self):
+        if self.info is None:
+            return
+        self.fitted = True
+        self.fitInView(self.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
+        self.schedule_update()
+
+    def zoom_by(self, factor):
+        if self.info is None:
+            return
+        current = self.transform().m11()
+        fit_scale = self._fit_scale(self.info)
+        target = min(max(current * factor, fit_scale), MAX_SCALE)
+        if target == current:
+            return
+        self.fitted = target <= fit_scale * 1.0001
+        self._start_fast()
+        self.scale(target / current, target / current)
+        self.schedule_update()
+
+    def schedule_update(self):
+        self.update_timer.start()
+
+    def _transformation_mode(self):
+        return Qt.TransformationMode.SmoothTransformation if self.smooth else Qt.TransformationMode.FastTransformation
+
+    def _start_fast(self):
+        """Draw with the fast transform until SETTLE_MS pass without another call"""
+        self._set_smooth(False)
+        self.settle_timer.start()
+
+    def _settle(self):
+        if self.fitted:
+            self.fit()
+        self._set_smooth(True)
+
+    def _set_smooth(self, smooth):
+        if smooth == self.smooth:
+            return
+        self.smooth = smooth
+        for item in self.tile_items.values():
+            item.setTransformationMode(self._transformation_mode())
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_by(ZOOM_STEP ** steps)
+        event.accept()
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.schedule_update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.info is None:
+            return
+        # Every resize step refits with the fast transform; the smooth redraw waits for the last one
+        self._start_fast()
+        if self.fitted:
+            self.fit()
+        else:
+            self.schedule_update()
+
+    def drawForeground(self, painter, rect):
+        if self.message:
+            painter.save()
+            painter.resetTransform()
+            painter.setFont(self.font())
+            painter.setPen(self.palette().windowText().color())
+            painter.drawText(self.viewport().rect(), Qt.AlignmentFlag.AlignCenter, self.message)
+            painter.restore()